@@ -7,10 +7,30 @@ import dash_bootstrap_components as dbc
 from sqlalchemy import create_engine
 from components.import_file import sidebar, SIDEBAR_STYLE
 from components.workshop import workshop
+from components.uploads import register_upload_routes
+from components.cache import invalidate_dataset
+from components.datasets import delete_dataset
+from components.metrics import register_metrics_routes
 import uuid # Required for test.py logic
+import os
+import logging
+import diskcache
+from dash import DiskcacheManager
+from importlib.util import find_spec
 
-# Initialize main application
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
+logging.basicConfig(level=os.environ.get("BI_LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Imports run as background jobs; the job queue lives on local disk, no broker is needed
+job_cache = diskcache.Cache(os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads", "jobs"))
+background_callback_manager = DiskcacheManager(job_cache)
+
+# Initialize main application; callback responses are gzipped when flask-compress is installed
+app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True,
+           background_callback_manager=background_callback_manager, compress=find_spec("flask_compress") is not None)
+server = app.server  # WSGI entry point for production servers, see gunicorn.conf.py
+register_upload_routes(server)
+register_metrics_routes(app)
 
 default_content = dbc.Container([
     html.Div([sidebar], id="sidebar-div"),
@@ -27,7 +47,8 @@ workshop_content = dbc.Container([
 # Application layout
 app.layout = html.Div([
     dcc.Location(id='url', refresh=True),  # refresh=True will completely refresh the page
-    dcc.Store(id="uploaded-data-store", storage_type="session"),     # Used to share data between pages
+    dcc.Store(id="uploaded-data-store", storage_type="session"),     # Handle of the server-side dataset, shared between pages
+    dcc.Store(id="previous-dataset-store", storage_type="session"),  # Id and version of the dataset the handle pointed to before
     html.Div(id='page-content')
 ])
 
@@ -35,16 +56,36 @@ app.layout = html.Div([
 @app.callback(
     Output('url', 'pathname'),
     Input('uploaded-data-store', 'data'),
+    State('url', 'pathname'),
     prevent_initial_call=True
 )
-def redirect_when_data_ready(data):
-    # If there is data, then redirect
-    if data and len(data) > 0:
-        print(f"Data is ready, redirecting to processing page, data length: {len(data)}")
+def redirect_when_data_ready(data, pathname=None):
+    # If there is data, then redirect; a refresh on the processing page keeps it as it is
+    if isinstance(data, dict) and data.get("dataset_id") and pathname != '/process':
+        logger.info("Data is ready, redirecting to processing page, rows: %s", data.get('rows'))
         return '/process'
     
     return dash.no_update
 
+# Imports run in job processes, so a replaced dataset's cached results and files are dropped here in the web process
+@app.callback(
+    Output('previous-dataset-store', 'data'),
+    Input('uploaded-data-store', 'data'),
+    State('previous-dataset-store', 'data'),
+    prevent_initial_call=True
+)
+def release_previous_dataset(data, previous):
+    current = {"dataset_id": data.get("dataset_id"), "version": data.get("version")} if isinstance(data, dict) else None
+    if isinstance(previous, dict) and previous.get("dataset_id") and previous != current:
+        if current and current["dataset_id"] == previous["dataset_id"]:
+            # A refresh appended rows as a new version, only the old version is stale
+            invalidate_dataset(previous["dataset_id"], previous["version"])
+        else:
+            # Replaced by another import, nothing points at it any more
+            invalidate_dataset(previous["dataset_id"])
+            delete_dataset(previous["dataset_id"])
+    return current
+
 @app.callback(
     Output('page-content', 'children'),
     Input('url', 'pathname')
@@ -58,6 +99,6 @@ def display_page(pathname):
         return default_content
 
 
-# Run application
+# Run application (development server; use `gunicorn -c gunicorn.conf.py` in production)
 if __name__ == '__main__':
     app.run(debug=True)
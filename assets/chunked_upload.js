@@ -0,0 +1,127 @@
+// Streams the file picked in the CSV modal to /upload/<id> in chunks.
+// The upload id is remembered per file, so a failed upload resumes from the last received byte.
+(function () {
+    const CHUNK_SIZE = 8 * 1024 * 1024;
+    const MAX_RETRIES = 5;
+
+    function setProps(id, props) {
+        if (window.dash_clientside && window.dash_clientside.set_props) {
+            window.dash_clientside.set_props(id, props);
+        }
+    }
+
+    function newUploadId() {
+        const bytes = new Uint8Array(16);
+        window.crypto.getRandomValues(bytes);
+        return Array.from(bytes, (b) => b.toString(16).padStart(2, "0")).join("");
+    }
+
+    function uploadIdFor(file) {
+        const key = "bi-upload:" + [file.name, file.size, file.lastModified].join(":");
+        let uploadId = window.localStorage.getItem(key);
+        if (!uploadId) {
+            uploadId = newUploadId();
+            window.localStorage.setItem(key, uploadId);
+        }
+        return { key: key, uploadId: uploadId };
+    }
+
+    async function received(uploadId) {
+        const response = await fetch("/upload/" + uploadId);
+        if (!response.ok) {
+            return 0;
+        }
+        return (await response.json()).received;
+    }
+
+    async function sendChunk(uploadId, file, start) {
+        const end = Math.min(start + CHUNK_SIZE, file.size);
+        const response = await fetch("/upload/" + uploadId, {
+            method: "PUT",
+            headers: {
+                "Content-Range": "bytes " + start + "-" + (end - 1) + "/" + file.size,
+                "X-Filename": encodeURIComponent(file.name),
+            },
+            body: file.slice(start, end),
+        });
+        const body = await response.json();
+        if (response.status === 409) {
+            return body.received;
+        }
+        if (!response.ok) {
+            throw new Error(body.error || response.statusText);
+        }
+        return body.received;
+    }
+
+    async function upload(file) {
+        const { key, uploadId } = uploadIdFor(file);
+        let offset = await received(uploadId);
+        let retries = 0;
+
+        while (offset < file.size) {
+            try {
+                offset = await sendChunk(uploadId, file, offset);
+                retries = 0;
+            } catch (error) {
+                retries += 1;
+                if (retries > MAX_RETRIES) {
+                    throw error;
+                }
+                await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** retries));
+                offset = await received(uploadId);
+            }
+            const percent = Math.floor((100 * offset) / file.size);
+            setProps("upload-text", { children: 'Uploading "' + file.name + '": ' + percent + "%" });
+        }
+
+        window.localStorage.removeItem(key);
+        setProps("upload-complete-store", {
+            data: { upload_id: uploadId, filename: file.name, size: file.size },
+        });
+    }
+
+    function start(file) {
+        if (!file) {
+            return;
+        }
+        if (file.size === 0) {
+            setProps("upload-text", { children: "The selected file is empty." });
+            return;
+        }
+        upload(file).catch(function (error) {
+            setProps("upload-text", { children: "Upload failed: " + error.message });
+        });
+    }
+
+    function dropZone(event) {
+        return event.target.closest && event.target.closest("#upload-in-modal");
+    }
+
+    document.addEventListener("click", function (event) {
+        if (!dropZone(event)) {
+            return;
+        }
+        const input = document.createElement("input");
+        input.type = "file";
+        input.accept = ".csv,.xls,.xlsx";
+        input.addEventListener("change", function () {
+            start(input.files[0]);
+        });
+        input.click();
+    });
+
+    document.addEventListener("dragover", function (event) {
+        if (dropZone(event)) {
+            event.preventDefault();
+        }
+    });
+
+    document.addEventListener("drop", function (event) {
+        if (!dropZone(event)) {
+            return;
+        }
+        event.preventDefault();
+        start(event.dataTransfer.files[0]);
+    });
+})();
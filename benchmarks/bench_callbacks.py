@@ -0,0 +1,200 @@
+"""Time the app's callbacks over synthetic datasets of growing size
+
+Calls the callback functions directly, without a browser, and records wall time,
+peak traced memory and the size of the JSON response Dash would send.
+
+    python benchmarks/bench_callbacks.py --rows 10000 100000 1000000
+    python benchmarks/bench_callbacks.py --compare benchmarks/results/<earlier run>.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+
+import numpy as np
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from components.cache import figure_cache, frame_cache, index_cache, view_cache  # noqa: E402
+from components.datasets import DATASET_DIR  # noqa: E402
+from components.import_file import update_csv_output  # noqa: E402
+from components.uploads import uploaded_file_path  # noqa: E402
+from components.workshop import create_data_source, update_graph, update_tab_content  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+DEFAULT_ROWS = [10000, 100000, 1000000]
+GRAPH_TYPES = ["histogram", "pie", "scatter", "line"]
+SHEETS = [{"id": "sheet-1", "label": "sheet1"}]
+
+
+def synthetic_csv(rows: int, path: str, seed: int = 0):
+    """Numeric, categorical and date columns, written as CSV like an upload would be"""
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        "date": (pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 4 * 365, rows), unit="D")).strftime("%Y-%m-%d"),
+        "region": rng.choice(["north", "south", "east", "west", "central"], rows),
+        "product": rng.choice([f"product-{i}" for i in range(200)], rows),
+        "quantity": rng.integers(1, 500, rows),
+        "price": rng.gamma(2.0, 50.0, rows).round(2),
+        "score": rng.normal(0, 1, rows),
+    }).to_csv(path, index=False)
+
+
+def clear_caches(*caches):
+    for cache in caches or (frame_cache, figure_cache, view_cache, index_cache):
+        cache.clear()
+
+
+def measure(call, setup=None, memory=True, repeat=1) -> dict:
+    """Best wall time of repeat calls, then the traced peak memory of another, identically prepared call"""
+    wall = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = call()
+        elapsed = time.perf_counter() - start
+        wall = elapsed if wall is None else min(wall, elapsed)
+    response_bytes = len(to_json_plotly(result))
+
+    peak = None
+    if memory:
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            call()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {"wall_s": wall, "peak_mb": peak / 1024 / 1024 if peak is not None else None,
+            "response_bytes": response_bytes, "result": result}
+
+
+def bench_rows(rows: int, memory: bool = True, repeat: int = 1) -> list:
+    results = []
+
+    def record(callback, variant, measurement):
+        results.append({"rows": rows, "callback": callback, "variant": variant,
+                        **{k: v for k, v in measurement.items() if k != "result"}})
+        peak = f'{measurement["peak_mb"]:8.1f} MB' if measurement["peak_mb"] is not None else "       -"
+        print(f'{rows:>10,} {callback:<26} {variant:<10} {measurement["wall_s"] * 1000:10.1f} ms {peak} '
+              f'{measurement["response_bytes"]:>12,} B')
+
+    source = os.path.join(RESULTS_DIR, f"synthetic-{rows}.csv")
+    if not os.path.exists(source):
+        synthetic_csv(rows, source)
+
+    uploads = []
+
+    def upload():
+        upload_id = uuid.uuid4().hex
+        shutil.copy(source, uploaded_file_path(upload_id, "synthetic.csv"))
+        uploads.append({"upload_id": upload_id, "filename": "synthetic.csv"})
+
+    def import_csv():
+        handle, _ = update_csv_output(lambda progress: None, uploads[-1])
+        handles.append(handle)
+        return handle
+
+    handles = []
+    record("update_csv_output", "cold", measure(import_csv, upload, memory, repeat))
+    handle = handles[0]
+
+    try:
+        record("update_tab_content", "cold", measure(
+            lambda: update_tab_content("sheet-1", SHEETS, handle, {}), clear_caches, memory, repeat))
+        record("create_data_source", "cold", measure(lambda: create_data_source(handle), clear_caches, memory, repeat))
+        record("create_data_source", "warm", measure(lambda: create_data_source(handle), None, memory, repeat))
+
+        for graph_type in GRAPH_TYPES:
+            x_axis, y_axis = ("date", "price") if graph_type in ("line", "scatter") else ("region", "price")
+
+            def render():
+                return update_graph(graph_type, x_axis, y_axis, None, None, "date", None, None, None, [],
+                                    handle, "sheet-1")
+
+            # cold: loaded from disk, warm: frame cached, cached: figure cached
+            record(f"update_graph:{graph_type}", "cold", measure(render, clear_caches, memory, repeat))
+            record(f"update_graph:{graph_type}", "warm", measure(render, lambda: clear_caches(figure_cache), memory, repeat))
+            record(f"update_graph:{graph_type}", "cached", measure(render, None, memory, repeat))
+    finally:
+        for h in handles:
+            shutil.rmtree(os.path.join(DATASET_DIR, h["dataset_id"]), ignore_errors=True)
+        clear_caches()
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: list, baseline_path: str, threshold: float) -> list:
+    """Print the wall time ratio to a saved run and return the measurements slower than threshold"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["rows"], r["callback"], r["variant"]): r for r in json.load(f)["results"]}
+
+    regressions = []
+    print(f"\nCompared with {baseline_path}")
+    for result in results:
+        before = baseline.get((result["rows"], result["callback"], result["variant"]))
+        if before is None or not before["wall_s"]:
+            continue
+        ratio = result["wall_s"] / before["wall_s"]
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f'{result["rows"]:>10,} {result["callback"]:<26} {result["variant"]:<10} {ratio:6.2f}x '
+              f'{result["response_bytes"] - before["response_bytes"]:+12,} B{flag}')
+        if ratio > threshold:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="dataset sizes to run, e.g. 10000 10000000")
+    parser.add_argument("--output", help="where to save the results (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="wall time ratio reported as a regression")
+    parser.add_argument("--repeat", type=int, default=3, help="calls per measurement, the fastest is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run that measures peak memory")
+    args = parser.parse_args()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    print(f'{"rows":>10} {"callback":<26} {"variant":<10} {"wall":>13} {"peak":>11} {"response":>14}')
+    results = []
+    for rows in args.rows:
+        results.extend(bench_rows(rows, memory=not args.no_memory, repeat=args.repeat))
+
+    output = args.output or os.path.join(RESULTS_DIR, f'{datetime.datetime.now():%Y%m%d-%H%M%S}.json')
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    print(f"\nSaved {output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
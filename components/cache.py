@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Memory footprint of a DataFrame, including the payload of object columns"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by the total size of its values"""
+
+    def __init__(self, max_bytes: int, sizeof=frame_nbytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, nbytes: int | None = None):
+        if nbytes is None:
+            nbytes = self.sizeof(value)
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= self._items.pop(key)[1]
+            # A value larger than the whole budget is returned to the caller but never kept
+            if nbytes > self.max_bytes:
+                return value
+            self._items[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._items.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+        return value
+
+    def invalidate(self, predicate):
+        """Drop every entry whose key matches predicate(key)"""
+        with self._lock:
+            for key in [key for key in self._items if predicate(key)]:
+                self.current_bytes -= self._items.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Materialized DataFrames shared by every workshop callback in this process
+FRAME_CACHE_MB = int(os.environ.get("BI_FRAME_CACHE_MB", "1024"))
+frame_cache = LRUCache(FRAME_CACHE_MB * 1024 * 1024)
+
+# Figures as plain JSON-ready dicts, keyed by dataset id/version and the sheet's chart settings
+FIGURE_CACHE_MB = int(os.environ.get("BI_FIGURE_CACHE_MB", "256"))
+figure_cache = LRUCache(FIGURE_CACHE_MB * 1024 * 1024, sizeof=lambda figure: len(json.dumps(figure)))
+
+# Rendered sheet tools with their figure, keyed by dataset id/version and the sheet's chart settings
+LAYOUT_CACHE_MB = int(os.environ.get("BI_LAYOUT_CACHE_MB", "128"))
+layout_cache = LRUCache(LAYOUT_CACHE_MB * 1024 * 1024, sizeof=lambda layout: len(to_json_plotly(layout)))
+
+# Row orders of filtered/sorted Data Source previews, so paging through the same view is a slice
+view_cache = LRUCache(256 * 1024 * 1024, sizeof=lambda order: order.nbytes)
+
+# Categorical codes and bitmaps of filtered columns, keyed by dataset id/version and column
+index_cache = LRUCache(512 * 1024 * 1024, sizeof=lambda index: index.max_nbytes)
+
+
+def cache_figure(key, fig) -> dict:
+    """Serialize a figure once and keep it in the figure cache"""
+    if isinstance(fig, dict):
+        return figure_cache.put(key, fig)
+    payload = fig.to_json()
+    return figure_cache.put(key, json.loads(payload), nbytes=len(payload))
+
+
+def invalidate_dataset(dataset_id: str, version: int | None = None):
+    """Drop every cached frame, figure, sheet layout, preview view and filter index of a dataset, or of one of its versions"""
+    for cache in (frame_cache, figure_cache, layout_cache, view_cache, index_cache):
+        cache.invalidate(lambda key: key[0] == dataset_id and (version is None or key[1] == version))
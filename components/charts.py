@@ -0,0 +1,285 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from dash import Patch
+
+from components.metrics import timed
+
+# Histogram and pie figures are aggregated here, so their size depends on bins and slices, not rows
+DEFAULT_BINS = 20
+DEFAULT_TOP_N = 10
+OTHER_LABEL = "Other"
+
+
+def _is_binnable(series: pd.Series) -> bool:
+    return (pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)) \
+        or pd.api.types.is_datetime64_any_dtype(series)
+
+
+def aggregate_histogram(df: pd.DataFrame, x_axis: str, y_axis: str, bins: int = DEFAULT_BINS) -> tuple[pd.DataFrame, float | None]:
+    """Average of y per x bin (numeric or temporal x) or per x category, and the bin width"""
+    x = df[x_axis]
+    y = pd.to_numeric(df[y_axis], errors="coerce")
+
+    if not _is_binnable(x):
+        agg = y.groupby(x, sort=True, observed=True).mean()
+        return pd.DataFrame({x_axis: agg.index, y_axis: agg.to_numpy()}), None
+
+    is_datetime = pd.api.types.is_datetime64_any_dtype(x)
+    valid = x.notna().to_numpy() & y.notna().to_numpy()
+    x_values = x.to_numpy()[valid]
+    x_values = x_values.astype("datetime64[ns]").view("int64") if is_datetime else x_values.astype("float64")
+    y_values = y.to_numpy(dtype="float64", na_value=np.nan)[valid]
+    if len(x_values) == 0:
+        return pd.DataFrame({x_axis: [], y_axis: []}), None
+
+    bins = max(int(bins or DEFAULT_BINS), 1)
+    low, high = float(x_values.min()), float(x_values.max())
+    width = (high - low) / bins if high > low else 1.0
+    index = np.clip(((x_values - low) // width).astype("int64"), 0, bins - 1)
+
+    sums = np.bincount(index, weights=y_values, minlength=bins)
+    counts = np.bincount(index, minlength=bins)
+    return binned_histogram(x_axis, y_axis, low, width, sums, counts, is_datetime)
+
+
+def binned_histogram(x_axis: str, y_axis: str, low: float, width: float, sums: np.ndarray, counts: np.ndarray,
+                     is_datetime: bool = False) -> tuple[pd.DataFrame, float]:
+    """Bin centers and average y from per-bin sums and counts, and the bin width"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        averages = np.where(counts > 0, sums / counts, np.nan)
+
+    centers = low + width * (np.arange(len(counts)) + 0.5)
+    if is_datetime:
+        centers = pd.to_datetime(centers.astype("int64"))
+        # Bar widths on a date axis are given in milliseconds
+        width = width / 1e6
+    return pd.DataFrame({x_axis: centers, y_axis: averages}), width
+
+
+def histogram_figure(agg: pd.DataFrame, x_axis: str, y_axis: str, width: float | None = None):
+    fig = px.bar(agg, x=x_axis, y=y_axis)
+    if width is not None:
+        # Adjacent bins, like a plotly histogram
+        fig.update_traces(width=width)
+        fig.update_layout(bargap=0)
+    fig.update_layout(yaxis_title=f"avg of {y_axis}")
+    return fig
+
+
+def aggregate_pie(df: pd.DataFrame, names: str, values: str | None) -> pd.DataFrame:
+    """Sum of values (or row count) per name"""
+    if values:
+        agg = pd.to_numeric(df[values], errors="coerce").groupby(df[names], observed=True).sum()
+    else:
+        agg = df.groupby(names, observed=True).size()
+    return pd.DataFrame({names: agg.index, values or "count": agg.to_numpy()})
+
+
+def collapse_top_n(agg: pd.DataFrame, names: str, values: str, top_n: int = DEFAULT_TOP_N) -> pd.DataFrame:
+    """Keep the top_n largest slices and fold the rest into a single "Other" slice"""
+    top_n = max(int(top_n or DEFAULT_TOP_N), 1)
+    agg = agg.sort_values(values, ascending=False, kind="stable")
+    if len(agg) <= top_n:
+        return agg
+    head = agg.iloc[:top_n]
+    other = pd.DataFrame({names: [OTHER_LABEL], values: [agg[values].iloc[top_n:].sum()]})
+    head = head.astype({names: object})
+    return pd.concat([head, other], ignore_index=True)
+
+
+def pie_figure(agg: pd.DataFrame, names: str, values: str | None, top_n: int = DEFAULT_TOP_N):
+    values = values or "count"
+    return px.pie(collapse_top_n(agg, names, values, top_n), names=names, values=values)
+
+
+# Scatter and line charts switch to WebGL and level-of-detail reduction once they get large
+LOD_GRAPH_TYPES = ("scatter", "line")
+WEBGL_THRESHOLD = 10000
+LINE_MAX_POINTS = 4000
+DENSITY_THRESHOLD = 100000
+DENSITY_BINS = 200
+
+
+def parse_axis_range(relayout_data: dict | None, axis: str) -> list | None:
+    """[low, high] of a zoomed axis from a graph's relayoutData, None when not zoomed"""
+    if not relayout_data or relayout_data.get(f"{axis}.autorange"):
+        return None
+    if f"{axis}.range[0]" in relayout_data and f"{axis}.range[1]" in relayout_data:
+        return [relayout_data[f"{axis}.range[0]"], relayout_data[f"{axis}.range[1]"]]
+    if f"{axis}.range" in relayout_data:
+        return list(relayout_data[f"{axis}.range"])
+    return None
+
+
+def range_bounds(dtype, axis_range: list) -> tuple | None:
+    """(low, high) of a zoomed range in a column's type, None when the range does not fit the column
+
+    A zoom can be left over from another column, e.g. date strings after switching x to a numeric column.
+    """
+    try:
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            # Date axes report their range as date strings, numbers would be read as nanoseconds
+            if not all(isinstance(value, str) for value in axis_range[:2]):
+                return None
+            return pd.Timestamp(axis_range[0]), pd.Timestamp(axis_range[1])
+        return float(axis_range[0]), float(axis_range[1])
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def minmax_downsample(y_values: np.ndarray, max_points: int) -> np.ndarray:
+    """Positions of the min and max y in each of max_points // 2 equal buckets, plus both ends
+
+    Keeps the peaks and troughs of a line, so its shape survives the reduction.
+    """
+    n = len(y_values)
+    if n <= max_points:
+        return np.arange(n)
+    buckets = max(max_points // 2, 1)
+    bucket_ids = np.arange(n) * buckets // n
+    y = pd.Series(y_values)
+    grouped = y.groupby(bucket_ids)
+    positions = np.concatenate([
+        [0, n - 1],
+        grouped.idxmin().dropna().to_numpy(dtype="int64"),
+        grouped.idxmax().dropna().to_numpy(dtype="int64"),
+    ])
+    return np.unique(positions)
+
+
+def line_figure(df: pd.DataFrame, x_axis: str, y_axis: str, x_range: list | None = None):
+    """Line chart of at most LINE_MAX_POINTS points over the visible x range"""
+    x = df[x_axis]
+    large = len(df) > WEBGL_THRESHOLD
+    ordered = _is_binnable(x)
+    if ordered:
+        if not x.is_monotonic_increasing:
+            df = df.iloc[np.argsort(x.to_numpy(), kind="stable")]
+            x = df[x_axis]
+        bounds = range_bounds(x.dtype, x_range) if x_range else None
+        if bounds:
+            low, high = bounds
+            # Keep one point beyond each edge so the line runs up to the border of the view
+            start = max(int(x.searchsorted(low, side="left")) - 1, 0)
+            stop = int(x.searchsorted(high, side="right")) + 1
+            df = df.iloc[start:stop]
+
+    y_values = pd.to_numeric(df[y_axis], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    if len(df) > LINE_MAX_POINTS:
+        df = df.iloc[minmax_downsample(y_values, LINE_MAX_POINTS)]
+
+    return px.line(df, x=x_axis, y=y_axis, render_mode="webgl" if large else "auto")
+
+
+def scatter_figure(df: pd.DataFrame, x_axis: str, y_axis: str, x_range: list | None = None, y_range: list | None = None):
+    """Scatter plot, WebGL above WEBGL_THRESHOLD points and a density heatmap above DENSITY_THRESHOLD"""
+    x, y = df[x_axis], df[y_axis]
+    large = len(df) > WEBGL_THRESHOLD
+    numeric = _is_binnable(x) and _is_binnable(y)
+
+    if numeric:
+        mask = np.ones(len(df), dtype=bool)
+        for values, axis_range in ((x, x_range), (y, y_range)):
+            bounds = range_bounds(values.dtype, axis_range) if axis_range else None
+            if bounds:
+                low, high = bounds
+                mask &= ((values >= low) & (values <= high)).to_numpy()
+        if not mask.all():
+            df = df[mask]
+            x, y = df[x_axis], df[y_axis]
+
+    if numeric and len(df) > DENSITY_THRESHOLD:
+        return density_figure(x, y, x_axis, y_axis)
+
+    return px.scatter(df, x=x_axis, y=y_axis, render_mode="webgl" if large else "auto")
+
+
+def density_figure(x: pd.Series, y: pd.Series, x_axis: str, y_axis: str, bins: int = DENSITY_BINS):
+    """Point counts on a bins x bins grid, drawn as a heatmap"""
+    def numeric_values(series):
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series.to_numpy(dtype="datetime64[ns]").view("int64").astype("float64")
+        return series.to_numpy(dtype="float64", na_value=np.nan)
+
+    x_values, y_values = numeric_values(x), numeric_values(y)
+    valid = ~(np.isnan(x_values) | np.isnan(y_values))
+    counts, x_edges, y_edges = np.histogram2d(x_values[valid], y_values[valid], bins=bins)
+    return density_heatmap(counts, x_edges, y_edges, x_axis, y_axis,
+                           pd.api.types.is_datetime64_any_dtype(x), pd.api.types.is_datetime64_any_dtype(y))
+
+
+def density_heatmap(counts: np.ndarray, x_edges: np.ndarray, y_edges: np.ndarray, x_axis: str, y_axis: str,
+                    x_datetime: bool = False, y_datetime: bool = False):
+    """Heatmap of point counts indexed [x bin, y bin], with the bin edges of both axes"""
+    def centers(edges, is_datetime):
+        middle = (edges[:-1] + edges[1:]) / 2
+        if is_datetime:
+            return pd.to_datetime(middle.astype("int64"))
+        return middle
+
+    # Empty cells stay transparent
+    z = np.where(counts.T > 0, counts.T, np.nan)
+    fig = px.imshow(
+        z,
+        x=centers(x_edges, x_datetime),
+        y=centers(y_edges, y_datetime),
+        origin="lower",
+        aspect="auto",
+        labels={"x": x_axis, "y": y_axis, "color": "points"},
+        color_continuous_scale="Viridis",
+    )
+    return fig
+
+
+@timed("build_figure")
+def build_figure(df: pd.DataFrame, graph_type: str, x_axis: str, y_axis: str | None, bins: int | None = None,
+                 top_n: int | None = None, x_range: list | None = None, y_range: list | None = None):
+    """Figure of a sheet's chart settings over an already filtered DataFrame"""
+    # Histograms and pies are aggregated here, only the bars and slices are sent to the browser
+    if graph_type == "histogram":
+        agg, width = aggregate_histogram(df, x_axis, y_axis, bins or DEFAULT_BINS)
+        fig = histogram_figure(agg, x_axis, y_axis, width)
+    elif graph_type == "pie":
+        fig = pie_figure(aggregate_pie(df, x_axis, y_axis), x_axis, y_axis, top_n or DEFAULT_TOP_N)
+    elif graph_type == "scatter":
+        fig = scatter_figure(df, x_axis, y_axis, x_range, y_range)
+    elif graph_type == "line":
+        fig = line_figure(df, x_axis, y_axis, x_range)
+    else:
+        return {}
+
+    if graph_type in LOD_GRAPH_TYPES:
+        # Keep the user's zoom across re-renders until the chart itself changes
+        fig.update_layout(uirevision=f"{graph_type}|{x_axis}|{y_axis}")
+    return fig
+
+
+def _patch_keys(patch, previous: dict, current: dict):
+    for key in previous.keys() - current.keys():
+        del patch[key]
+    for key, value in current.items():
+        if previous.get(key) != value:
+            patch[key] = value
+
+
+def figure_patch(previous: dict | None, figure):
+    """Partial update turning the figure the browser shows into figure
+
+    Only the traces and the layout keys that differ are sent; figure is returned
+    whole when there is no previous figure to patch.
+    """
+    if not isinstance(figure, dict) or not figure or not previous:
+        return figure
+    patch = Patch()
+    old_traces, new_traces = previous.get("data", []), figure.get("data", [])
+    if len(old_traces) != len(new_traces):
+        patch["data"] = new_traces
+    else:
+        for i, (old, new) in enumerate(zip(old_traces, new_traces)):
+            if old.get("type") != new.get("type"):
+                patch["data"][i] = new
+            elif old != new:
+                _patch_keys(patch["data"][i], old, new)
+    _patch_keys(patch["layout"], previous.get("layout", {}), figure.get("layout", {}))
+    return patch
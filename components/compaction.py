@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+from components.parsing import HAS_PYARROW
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_RATIO = 0.5
+# Other text columns are stored as Arrow strings when pyarrow is available
+STRING_DTYPE = "string[pyarrow]" if HAS_PYARROW else None
+
+
+def _column_nbytes(column: pd.Series) -> int:
+    return int(column.memory_usage(index=False, deep=True))
+
+
+def _compact_numeric(column: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(column) and column.dtype.kind in "iu":
+        return pd.to_numeric(column, downcast="integer")
+    if column.dtype == np.float64:
+        # Only when every value survives the round trip, so no figure ever shows a rounded number
+        narrow = column.astype(np.float32)
+        same = (narrow.astype(np.float64) == column) | column.isna()
+        return narrow if same.all() else column
+    return column
+
+
+def _compact_text(column: pd.Series) -> pd.Series:
+    if pd.api.types.infer_dtype(column, skipna=True) != "string":
+        return column
+    if column.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(column):
+        # Sorted categories, so sorting and range filters on codes follow the text order
+        return column.astype("category")
+    if STRING_DTYPE:
+        return column.astype(STRING_DTYPE)
+    return column
+
+
+def compact_frame(df: pd.DataFrame) -> tuple[pd.DataFrame, list]:
+    """Downcast numeric columns and store text as categoricals or Arrow strings
+
+    Returns the compacted frame and a per-column report of dtypes and bytes before and after.
+    """
+    df = df.copy(deep=False)
+    report = []
+    for col in df.columns:
+        column = df[col]
+        before = _column_nbytes(column)
+        if pd.api.types.is_bool_dtype(column):
+            compacted = column
+        elif pd.api.types.is_numeric_dtype(column):
+            compacted = _compact_numeric(column)
+        elif column.dtype == object:
+            compacted = _compact_text(column)
+        else:
+            compacted = column
+        df[col] = compacted
+        report.append({
+            "column": col,
+            "dtype_before": str(column.dtype),
+            "dtype_after": str(compacted.dtype),
+            "bytes_before": before,
+            "bytes_after": _column_nbytes(compacted) if compacted is not column else before,
+        })
+    return df, report
+
+
+def format_bytes(nbytes: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(nbytes) < 1024 or unit == "GB":
+            return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+
+
+def _append_column(old: pd.Series, new: pd.Series) -> pd.Series:
+    if isinstance(old.dtype, pd.CategoricalDtype):
+        try:
+            # Only the category lists are merged, existing rows are just recoded
+            return pd.Series(pd.api.types.union_categoricals([old, new.astype("category")], sort_categories=True))
+        except TypeError:
+            return _compact_text(pd.concat([old.astype(object), new.astype(object)], ignore_index=True))
+    if pd.api.types.is_datetime64_any_dtype(old):
+        new = pd.to_datetime(new, errors="coerce")
+        if getattr(new.dt, "tz", None) is not None:
+            new = new.dt.tz_convert(None)
+        return pd.concat([old, new], ignore_index=True)
+    if STRING_DTYPE and str(old.dtype) == "string":
+        return pd.concat([old, new.astype(old.dtype)], ignore_index=True)
+    combined = pd.concat([old, new], ignore_index=True)
+    if pd.api.types.is_numeric_dtype(combined) and not pd.api.types.is_bool_dtype(combined):
+        # New values may not fit the old width, downcast the combined column again
+        return _compact_numeric(combined)
+    return combined
+
+
+def append_compacted(df: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+    """Append rows to a compacted frame, keeping its dtypes wherever the new values fit"""
+    rows = rows.reindex(columns=df.columns).reset_index(drop=True)
+    return pd.DataFrame({col: _append_column(df[col], rows[col]) for col in df.columns})
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
+
+from components.locks import HAS_FILE_LOCKS, file_lock
+
+# One pooled engine per MySQL source, shared by every session in the process
+POOL_SIZE = int(os.environ.get("BI_DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.environ.get("BI_DB_MAX_OVERFLOW", "5"))
+POOL_RECYCLE_SECONDS = 1800
+IDLE_SECONDS = int(os.environ.get("BI_DB_IDLE_SECONDS", "600"))
+SOURCE_CONCURRENCY = int(os.environ.get("BI_DB_SOURCE_CONCURRENCY", "2"))
+ACQUIRE_TIMEOUT_SECONDS = 60
+# Imports run in job processes of their own, so a source's slots are lock files every process competes for
+SLOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads", "locks")
+SLOT_POLL_SECONDS = 0.1
+
+
+class _Source:
+    def __init__(self, key: tuple, engine):
+        self.key = key
+        self.engine = engine
+        self.slots = threading.BoundedSemaphore(SOURCE_CONCURRENCY)
+        self.active = 0
+        self.last_used = time.monotonic()
+
+
+_sources = {}
+_lock = threading.Lock()
+
+
+def _source_key(host, port, username, password, db_name) -> tuple:
+    return (host or "localhost", int(port or 3306), username or "", password or "", db_name or "")
+
+
+def _evict_idle(now: float):
+    for key, source in list(_sources.items()):
+        if source.active == 0 and now - source.last_used > IDLE_SECONDS:
+            del _sources[key]
+            source.engine.dispose()
+
+
+def _get_source(host, port, username, password, db_name) -> _Source:
+    key = _source_key(host, port, username, password, db_name)
+    with _lock:
+        now = time.monotonic()
+        _evict_idle(now)
+        source = _sources.get(key)
+        if source is None:
+            url = URL.create(
+                "mysql+pymysql",
+                username=key[2],
+                password=key[3],
+                host=key[0],
+                port=key[1],
+                database=key[4],
+            )
+            engine = create_engine(
+                url,
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+                pool_pre_ping=True,
+                pool_recycle=POOL_RECYCLE_SECONDS,
+            )
+            source = _sources[key] = _Source(key, engine)
+        source.last_used = now
+        return source
+
+
+def get_engine(host, port, username, password, db_name):
+    """Pooled engine for a MySQL source, created on first use"""
+    return _get_source(host, port, username, password, db_name).engine
+
+
+def _slot_paths(key: tuple) -> list:
+    # Named by a hash of the source without its password, so renamed credentials share the slots
+    name = hashlib.sha256(repr((key[0], key[1], key[2], key[4])).encode()).hexdigest()[:16]
+    return [os.path.join(SLOT_DIR, f"{name}-{slot}.lock") for slot in range(SOURCE_CONCURRENCY)]
+
+
+def _busy(key: tuple) -> TimeoutError:
+    return TimeoutError(f"Too many concurrent imports from {key[0]}:{key[1]}/{key[4]}, please retry later")
+
+
+@contextmanager
+def _source_slot(source: _Source):
+    """Hold one of the source's SOURCE_CONCURRENCY slots, against every thread and process of the app"""
+    if not HAS_FILE_LOCKS:
+        if not source.slots.acquire(timeout=ACQUIRE_TIMEOUT_SECONDS):
+            raise _busy(source.key)
+        try:
+            yield
+        finally:
+            source.slots.release()
+        return
+
+    os.makedirs(SLOT_DIR, exist_ok=True)
+    deadline = time.monotonic() + ACQUIRE_TIMEOUT_SECONDS
+    while True:
+        for path in _slot_paths(source.key):
+            # Also released by the kernel when a job process dies holding it
+            with file_lock(path, blocking=False) as held:
+                if held:
+                    yield
+                    return
+        if time.monotonic() >= deadline:
+            raise _busy(source.key)
+        time.sleep(SLOT_POLL_SECONDS)
+
+
+@contextmanager
+def source_connection(host, port, username, password, db_name):
+    """Connection from the source's pool, limited to SOURCE_CONCURRENCY concurrent users per source
+
+    The limit holds across server workers and import jobs, so it also bounds the connections
+    the app opens to one source at a time.
+    """
+    source = _get_source(host, port, username, password, db_name)
+    with _source_slot(source):
+        with _lock:
+            source.active += 1
+        try:
+            with source.engine.connect() as connection:
+                yield connection
+        finally:
+            with _lock:
+                source.active -= 1
+                source.last_used = time.monotonic()
+
+
+def pool_stats() -> dict:
+    """Checked-out and idle connections per source, for diagnostics"""
+    with _lock:
+        return {
+            f"{key[2]}@{key[0]}:{key[1]}/{key[4]}": {
+                "active_imports": source.active,
+                "checked_out": source.engine.pool.checkedout(),
+                "pooled": source.engine.pool.checkedin(),
+            }
+            for key, source in _sources.items()
+        }
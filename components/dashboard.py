@@ -0,0 +1,45 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Dashboard charts are computed on a bounded pool per process; pandas, numpy and DuckDB release the GIL
+# in their vectorized parts, so the charts of a dashboard are computed side by side
+DASHBOARD_WORKERS = int(os.environ.get("BI_DASHBOARD_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+# Charts still computing after this many seconds are shown as timed out; their computation carries on
+# and lands in the figure cache, so the next visit of the dashboard shows them
+SHEET_TIMEOUT = float(os.environ.get("BI_SHEET_TIMEOUT", "30"))
+
+_pool = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix="dashboard")
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def start_render(key, func, *args, **kwargs) -> Future:
+    """Compute func on the pool, or join the computation of the same key already in flight"""
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is not None:
+            return future
+        future = _pending[key] = _pool.submit(func, *args, **kwargs)
+    # Outside the lock, a future that is already done runs its callback right away
+    future.add_done_callback(lambda done: _forget(key, done))
+    return future
+
+
+def _forget(key, future: Future):
+    with _pending_lock:
+        if _pending.get(key) is future:
+            del _pending[key]
+
+
+def message_figure(text: str) -> dict:
+    """Empty figure showing a message in place of a chart"""
+    hidden = {"visible": False}
+    return {
+        "data": [],
+        "layout": {
+            "xaxis": hidden,
+            "yaxis": hidden,
+            "annotations": [{"text": text, "showarrow": False, "xref": "paper", "yref": "paper", "x": 0.5, "y": 0.5}],
+        },
+    }
@@ -0,0 +1,363 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from components.cache import frame_cache
+from components.compaction import append_compacted, compact_frame
+from components.dates import build_date_index, detect_date_columns, merge_date_index, range_positions
+from components.engine import PARQUET_ROW_GROUP, engine_enabled
+from components.metrics import frame_loads, timed
+from components.parsing import HAS_PYARROW
+from components.profile import profile_frame
+
+if HAS_PYARROW:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Text stays in Arrow buffers instead of becoming Python objects
+    _ARROW_STRINGS = {pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}
+
+# Imported datasets live on the server; the browser only keeps a small handle
+DATASET_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads", "datasets")
+# Datasets replaced in their session are deleted right away; those of sessions that simply ended are
+# deleted once unused for this long
+RETENTION_HOURS = float(os.environ.get("BI_DATASET_RETENTION_HOURS", "168"))
+# How often a dataset's last use is recorded, and how often unused datasets are looked for
+USE_RESOLUTION_SECONDS = 3600
+
+_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def _dataset_path(dataset_id: str) -> str:
+    # Dataset ids are generated here, never trust anything that is not a plain hex id
+    if not dataset_id or not all(c in "0123456789abcdef" for c in dataset_id):
+        raise ValueError(f"Invalid dataset id: {dataset_id!r}")
+    return os.path.join(DATASET_DIR, dataset_id)
+
+
+def _frame_path(dataset_id: str, version: int, suffix: str = "arrow") -> str:
+    return os.path.join(_dataset_path(dataset_id), f"v{version}.{suffix}")
+
+
+def _meta_path(dataset_id: str) -> str:
+    return os.path.join(_dataset_path(dataset_id), "meta.json")
+
+
+def _date_index_path(dataset_id: str, version: int, position: int, part: str) -> str:
+    # Indexed by column position, column names are not safe in file names
+    return os.path.join(_dataset_path(dataset_id), f"v{version}-date{position}-{part}.npy")
+
+
+def _secret_path(dataset_id: str) -> str:
+    return os.path.join(_dataset_path(dataset_id), "secret.json")
+
+
+def make_handle(dataset_id: str, version: int, df: pd.DataFrame, date_columns: list | None = None) -> dict:
+    """Build the handle stored in uploaded-data-store"""
+    return {
+        "dataset_id": dataset_id,
+        "version": version,
+        "rows": len(df),
+        "schema": [{"name": col, "dtype": str(dtype)} for col, dtype in df.dtypes.items()],
+        "date_columns": date_columns or [],
+    }
+
+
+def _mappable(df: pd.DataFrame, table):
+    """The table with NaN kept as a float value rather than a null
+
+    Columns with nulls are rebuilt on load, so floats with NaN would otherwise be copied into every worker.
+    The Parquet copy keeps the nulls, which the engine's SQL skips like pandas skips NaN.
+    """
+    for position, (name, column) in enumerate(df.items()):
+        if isinstance(column.dtype, np.dtype) and column.dtype.kind == "f" and table.column(position).null_count:
+            table = table.set_column(position, table.field(position),
+                                     pa.array(column.to_numpy(), type=table.field(position).type, from_pandas=False))
+    return table
+
+
+def _write_frame(dataset_id: str, version: int, df: pd.DataFrame):
+    """Store a version as an uncompressed Arrow IPC file, or a pickle for columns Arrow cannot hold"""
+    path = _frame_path(dataset_id, version)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        if not HAS_PYARROW:
+            raise TypeError("pyarrow is not installed")
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(_mappable(df, table))
+        if engine_enabled(len(df)):
+            # Compressed, row-grouped copy that the chart engine scans instead of loading the frame
+            parquet_tmp = f"{tmp}.parquet"
+            pq.write_table(table, parquet_tmp, row_group_size=PARQUET_ROW_GROUP)
+            os.replace(parquet_tmp, _frame_path(dataset_id, version, "parquet"))
+    except (TypeError, ValueError, NotImplementedError):
+        # e.g. object columns mixing numbers and text; Arrow's errors subclass these
+        path = _frame_path(dataset_id, version, "pkl")
+        df.to_pickle(tmp)
+    # Other workers may be mapping this version, so it only ever appears complete
+    os.replace(tmp, path)
+
+
+def _read_frame(dataset_id: str, version: int) -> pd.DataFrame | None:
+    path = _frame_path(dataset_id, version)
+    if HAS_PYARROW and os.path.exists(path):
+        # Columns are views of the mapped file, so every worker shares the same page cache instead of
+        # holding its own copy; categorical codes, booleans and columns with nulls (missing dates,
+        # nullable integers) are copied
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        return table.to_pandas(split_blocks=True, types_mapper=_ARROW_STRINGS.get)
+    path = _frame_path(dataset_id, version, "pkl")
+    if os.path.exists(path):
+        return pd.read_pickle(path)
+    return None
+
+
+def _write_date_indexes(dataset_id: str, version: int, df: pd.DataFrame, date_columns: list):
+    for col in date_columns:
+        position = df.columns.get_loc(col)
+        sorted_values, order = build_date_index(df[col])
+        np.save(_date_index_path(dataset_id, version, position, "values"), sorted_values)
+        np.save(_date_index_path(dataset_id, version, position, "order"), order)
+
+
+@timed("register_dataset")
+def register_dataset(df: pd.DataFrame, source: dict | None = None, secrets: dict | None = None) -> dict:
+    """Keep an imported DataFrame on the server and return its handle
+
+    secrets (e.g. a database password for live queries) are stored next to the
+    dataset, readable only by the server user, and never sent to the browser.
+    """
+    df = df.copy(deep=False)
+    df.columns = [str(col) for col in df.columns]
+    # Dates are parsed once here, and sorted so range filters become binary searches
+    df, date_columns = detect_date_columns(df)
+    # Then every import is downcast and its text stored compactly before it is cached or written
+    df, memory = compact_frame(df)
+    # Profiled once per version, so the sheet tools never have to touch the rows
+    profile = profile_frame(df)
+
+    dataset_id = uuid.uuid4().hex
+    version = 1
+    handle = make_handle(dataset_id, version, df, date_columns)
+
+    with _lock:
+        os.makedirs(_dataset_path(dataset_id), exist_ok=True)
+        _write_frame(dataset_id, version, df)
+        _write_date_indexes(dataset_id, version, df, date_columns)
+        with open(_meta_path(dataset_id), "w", encoding="utf-8") as f:
+            json.dump({**handle, "source": source or {}, "memory": memory, "profile": profile}, f)
+        if secrets:
+            fd = os.open(_secret_path(dataset_id), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(secrets, f)
+    frame_cache.put((dataset_id, version), df)
+    sweep_datasets()
+
+    return handle
+
+
+def _append_date_indexes(dataset_id: str, version: int, df: pd.DataFrame, offset: int, date_columns: list):
+    for col in date_columns:
+        position = df.columns.get_loc(col)
+        try:
+            sorted_values = np.load(_date_index_path(dataset_id, version - 1, position, "values"))
+            order = np.load(_date_index_path(dataset_id, version - 1, position, "order"))
+            sorted_values, order = merge_date_index(sorted_values, order, df[col].iloc[offset:], offset)
+        except OSError:
+            sorted_values, order = build_date_index(df[col])
+        np.save(_date_index_path(dataset_id, version, position, "values"), sorted_values)
+        np.save(_date_index_path(dataset_id, version, position, "order"), order)
+
+
+def _remove_version(dataset_id: str, version: int):
+    prefix = f"v{version}"
+    for name in os.listdir(_dataset_path(dataset_id)):
+        if name in (f"{prefix}.arrow", f"{prefix}.parquet", f"{prefix}.pkl") or name.startswith(f"{prefix}-"):
+            os.remove(os.path.join(_dataset_path(dataset_id), name))
+
+
+def append_dataset(handle: dict, rows: pd.DataFrame) -> dict:
+    """Store a dataset with rows appended as its next version, and return the new handle
+
+    Date indexes are merged with the new rows instead of being rebuilt.
+    """
+    df = load_dataset(handle)
+    if df is None:
+        raise ValueError("The dataset to append to no longer exists")
+    rows = rows.copy(deep=False)
+    rows.columns = [str(col) for col in rows.columns]
+    combined = append_compacted(df, rows)
+
+    dataset_id = handle["dataset_id"]
+    version = handle["version"] + 1
+    date_columns = handle.get("date_columns", [])
+    new_handle = make_handle(dataset_id, version, combined, date_columns)
+
+    with _lock:
+        _write_frame(dataset_id, version, combined)
+        _append_date_indexes(dataset_id, version, combined, len(df), date_columns)
+        with open(_meta_path(dataset_id), encoding="utf-8") as f:
+            meta = json.load(f)
+        for col in meta.get("memory", []):
+            if col["column"] in rows.columns:
+                col["bytes_before"] += int(rows[col["column"]].memory_usage(index=False, deep=True))
+            col["dtype_after"] = str(combined[col["column"]].dtype)
+            col["bytes_after"] = int(combined[col["column"]].memory_usage(index=False, deep=True))
+        with open(_meta_path(dataset_id), "w", encoding="utf-8") as f:
+            json.dump({**meta, **new_handle, "profile": profile_frame(combined)}, f)
+        # The browser store only ever points at the newest version
+        _remove_version(dataset_id, handle["version"])
+    frame_cache.put((dataset_id, version), combined)
+
+    return new_handle
+
+
+def load_dataset(handle: dict | None) -> pd.DataFrame | None:
+    """Resolve a handle from uploaded-data-store into its DataFrame, through the frame cache"""
+    if not isinstance(handle, dict) or "dataset_id" not in handle:
+        return None
+
+    key = (handle["dataset_id"], handle["version"])
+    _record_use(handle["dataset_id"])
+    df = frame_cache.get(key)
+    if df is not None:
+        return df
+
+    df = _read_frame(*key)
+    if df is None:
+        return None
+
+    # A cache miss maps the version's file again; pickled versions are rebuilt in full
+    frame_loads.inc()
+    return frame_cache.put(key, df)
+
+
+def _record_use(dataset_id: str):
+    # The meta file's modification time is the dataset's last use, refreshed at most once per USE_RESOLUTION_SECONDS
+    try:
+        path = _meta_path(dataset_id)
+        if time.time() - os.stat(path).st_mtime > USE_RESOLUTION_SECONDS:
+            os.utime(path)
+    except (OSError, ValueError):
+        pass
+
+
+def delete_dataset(dataset_id: str):
+    """Remove every stored file of a dataset: versions, Parquet copies, date indexes, metadata and secrets"""
+    shutil.rmtree(_dataset_path(dataset_id), ignore_errors=True)
+
+
+def sweep_datasets():
+    """Delete the datasets not used for RETENTION_HOURS, at most once per USE_RESOLUTION_SECONDS per process"""
+    global _last_sweep
+    now = time.time()
+    if now - _last_sweep < USE_RESOLUTION_SECONDS:
+        return
+    _last_sweep = now
+    for dataset_id in os.listdir(DATASET_DIR) if os.path.isdir(DATASET_DIR) else []:
+        try:
+            unused = now - os.stat(_meta_path(dataset_id)).st_mtime
+        except (OSError, ValueError):
+            continue
+        if unused > RETENTION_HOURS * 3600:
+            delete_dataset(dataset_id)
+
+
+def dataset_parquet_path(handle: dict | None) -> str | None:
+    """Parquet copy of a dataset version for the chart engine, None when it has none"""
+    if not isinstance(handle, dict) or "dataset_id" not in handle:
+        return None
+    path = _frame_path(handle["dataset_id"], handle["version"], "parquet")
+    return path if os.path.exists(path) else None
+
+
+def date_range_positions(handle: dict, column: str, start_date, end_date) -> np.ndarray | None:
+    """Row positions of a dataset whose date column lies in [start_date, end_date], None without an index"""
+    if column not in handle.get("date_columns", []):
+        return None
+    position = dataset_columns(handle).index(column)
+    try:
+        sorted_values = np.load(_date_index_path(handle["dataset_id"], handle["version"], position, "values"), mmap_mode="r")
+        order = np.load(_date_index_path(handle["dataset_id"], handle["version"], position, "order"), mmap_mode="r")
+    except OSError:
+        return None
+    return range_positions(sorted_values, order, start_date, end_date)
+
+
+def dataset_source(handle: dict | None, with_secrets: bool = False) -> dict:
+    """Where a dataset was imported from, optionally with its stored secrets"""
+    if not isinstance(handle, dict) or "dataset_id" not in handle:
+        return {}
+    try:
+        with open(_meta_path(handle["dataset_id"]), encoding="utf-8") as f:
+            source = json.load(f).get("source", {})
+        if with_secrets and os.path.exists(_secret_path(handle["dataset_id"])):
+            with open(_secret_path(handle["dataset_id"]), encoding="utf-8") as f:
+                source = {**source, **json.load(f)}
+    except (OSError, ValueError):
+        return {}
+    return source
+
+
+def dataset_profile(handle: dict | None) -> list:
+    """Column profile of a dataset version, computed when it was stored"""
+    if not isinstance(handle, dict) or "dataset_id" not in handle:
+        return []
+    try:
+        with open(_meta_path(handle["dataset_id"]), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return meta.get("profile", []) if meta.get("version") == handle["version"] else []
+
+
+def dataset_memory_report(handle: dict | None) -> list:
+    """Per-column dtypes and bytes of a dataset before and after import-time compaction"""
+    if not isinstance(handle, dict) or "dataset_id" not in handle:
+        return []
+    try:
+        with open(_meta_path(handle["dataset_id"]), encoding="utf-8") as f:
+            return json.load(f).get("memory", [])
+    except (OSError, ValueError):
+        return []
+
+
+def dataset_columns(handle: dict | None) -> list:
+    """Column names of a dataset, read from the handle without touching the rows"""
+    if not isinstance(handle, dict):
+        return []
+    return [col["name"] for col in handle.get("schema", [])]
+
+
+class DatasetWriter:
+    """Build a dataset from chunks, keeping one growing list of column pieces per column"""
+
+    def __init__(self, source: dict | None = None, secrets: dict | None = None):
+        self.source = source
+        self.secrets = secrets
+        self.rows = 0
+        self.nbytes = 0
+        self._columns = {}
+
+    def append(self, chunk: pd.DataFrame):
+        for col in chunk.columns:
+            self._columns.setdefault(str(col), []).append(chunk[col].reset_index(drop=True))
+        self.rows += len(chunk)
+        self.nbytes += int(chunk.memory_usage(index=False, deep=True).sum())
+
+    def finish(self) -> dict:
+        """Register the collected rows and return the dataset handle"""
+        columns = {}
+        # Concatenate one column at a time so only a single column is ever held twice
+        for col in list(self._columns):
+            pieces = self._columns.pop(col)
+            columns[col] = pd.concat(pieces, ignore_index=True) if len(pieces) > 1 else pieces[0]
+        return register_dataset(pd.DataFrame(columns, copy=False), self.source, self.secrets)
@@ -0,0 +1,76 @@
+import datetime
+import re
+
+import numpy as np
+import pandas as pd
+
+# A text column is treated as dates when most of a sample looks like one of these
+DATE_PATTERN = re.compile(r"^\d{4}[-/.]\d{1,2}[-/.]\d{1,2}([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?$")
+SAMPLE_SIZE = 1000
+MIN_MATCH_RATIO = 0.9
+
+
+def _looks_like_dates(column: pd.Series) -> bool:
+    sample = column.dropna().head(SAMPLE_SIZE)
+    if sample.empty:
+        return False
+    if sample.map(lambda v: isinstance(v, (datetime.date, datetime.datetime))).all():
+        return True
+    if not sample.map(lambda v: isinstance(v, str)).all():
+        return False
+    return sample.str.strip().str.match(DATE_PATTERN).mean() >= MIN_MATCH_RATIO
+
+
+def detect_date_columns(df: pd.DataFrame) -> tuple[pd.DataFrame, list]:
+    """Parse date-like text columns to datetime64 and list every temporal column"""
+    df = df.copy(deep=False)
+    date_columns = []
+    for col in df.columns:
+        column = df[col]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            date_columns.append(col)
+        elif column.dtype == object and _looks_like_dates(column):
+            try:
+                parsed = pd.to_datetime(column, format="ISO8601")
+            except (ValueError, TypeError):
+                parsed = pd.to_datetime(column, errors="coerce", format="mixed")
+            if getattr(parsed.dt, "tz", None) is not None:
+                parsed = parsed.dt.tz_convert(None)
+            df[col] = parsed
+            date_columns.append(col)
+    return df, date_columns
+
+
+def build_date_index(column: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Sorted values and the order permutation of a datetime column, missing dates last"""
+    values = column.to_numpy(dtype="datetime64[ns]")
+    order = np.argsort(values, kind="stable")
+    return values[order], order
+
+
+def merge_date_index(sorted_values: np.ndarray, order: np.ndarray, column: pd.Series, offset: int) -> tuple[np.ndarray, np.ndarray]:
+    """Extend a date index with the rows of column, appended at position offset"""
+    new_values, new_order = build_date_index(column)
+    values = np.concatenate([sorted_values, new_values])
+    order = np.concatenate([order, new_order + offset])
+    # Two sorted runs, which the stable sort merges in linear time
+    merge = np.argsort(values, kind="stable")
+    return values[merge], order[merge]
+
+
+def range_positions(sorted_values: np.ndarray, order: np.ndarray, start_date, end_date) -> np.ndarray:
+    """Row positions with start_date <= date <= end_date, found by binary search
+
+    A date without a time of day includes that whole day.
+    """
+    start = pd.Timestamp(start_date).to_datetime64()
+    end = pd.Timestamp(end_date)
+    if end == end.normalize():
+        end = end + pd.Timedelta(days=1)
+        side = "left"
+    else:
+        side = "right"
+    lo = np.searchsorted(sorted_values, start, side="left")
+    hi = np.searchsorted(sorted_values, end.to_datetime64(), side=side)
+    # Back to the dataset's own row order
+    return np.sort(order[lo:hi])
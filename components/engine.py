@@ -0,0 +1,276 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from components.charts import (DEFAULT_BINS, DEFAULT_TOP_N, DENSITY_BINS, DENSITY_THRESHOLD, LINE_MAX_POINTS,
+                               WEBGL_THRESHOLD, binned_histogram, density_heatmap, histogram_figure, pie_figure,
+                               range_bounds)
+from components.filters import coerce_value
+from components.metrics import timed
+
+try:
+    import duckdb
+    HAS_DUCKDB = True
+except ImportError:
+    HAS_DUCKDB = False
+
+# Datasets with at least this many rows also get a Parquet copy, and their charts are computed from it
+# by DuckDB, out of core and on every core, instead of from the DataFrame in memory
+ENGINE_MIN_ROWS = int(os.environ.get("BI_ENGINE_MIN_ROWS", "1000000"))
+ENGINE_THREADS = int(os.environ.get("BI_ENGINE_THREADS", str(os.cpu_count() or 1)))
+ENGINE_MEMORY_MB = int(os.environ.get("BI_ENGINE_MEMORY_MB", "1024"))
+# Row groups are DuckDB's unit of parallel work, and their min/max statistics let filters skip them
+PARQUET_ROW_GROUP = 256 * 1024
+# Sorts and aggregations larger than the memory limit spill here
+SPILL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads", "engine")
+
+ENGINE_GRAPH_TYPES = ("histogram", "pie", "scatter", "line")
+
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def engine_enabled(rows: int) -> bool:
+    """Whether a dataset of this many rows is stored for and charted by the engine"""
+    return HAS_DUCKDB and rows >= ENGINE_MIN_ROWS
+
+
+def _cursor():
+    # One database per process, each thread queries through its own cursor
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            os.makedirs(SPILL_DIR, exist_ok=True)
+            _connection = duckdb.connect(config={
+                "threads": ENGINE_THREADS,
+                "memory_limit": f"{ENGINE_MEMORY_MB}MB",
+                "temp_directory": SPILL_DIR,
+            })
+        return _connection.cursor()
+
+
+def _ident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _dtypes(schema: list) -> dict:
+    return {col["name"]: pd.api.types.pandas_dtype(col["dtype"]) for col in schema}
+
+
+def _is_binnable(dtype) -> bool:
+    return (pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)) \
+        or pd.api.types.is_datetime64_any_dtype(dtype)
+
+
+def _param(dtype, value):
+    # Filter values are typed like the column, then handed to DuckDB as plain Python values
+    value = coerce_value(pd.Series([], dtype=dtype), value)
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value.item() if hasattr(value, "item") else value
+
+
+def _numeric(name: str, dtype) -> str:
+    # Dates are binned on their nanoseconds, like the in-memory charts
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return f"CAST(epoch_ns({_ident(name)}) AS DOUBLE)"
+    return f"TRY_CAST({_ident(name)} AS DOUBLE)"
+
+
+def compile_filters(dtypes: dict, date_column: str | None, start_date, end_date, filters: list | None) -> tuple[str, list]:
+    """WHERE clause and parameters of a sheet's date range and column filters"""
+    clauses, params = ["TRUE"], []
+    if date_column in dtypes and start_date and end_date:
+        # Same bounds as dates.range_positions: a date without a time of day includes that whole day
+        end = pd.Timestamp(end_date)
+        end_op = "<="
+        if end == end.normalize():
+            end, end_op = end + pd.Timedelta(days=1), "<"
+        clauses.append(f"{_ident(date_column)} >= ? AND {_ident(date_column)} {end_op} ?")
+        params += [pd.Timestamp(start_date).to_pydatetime(), end.to_pydatetime()]
+
+    for predicate in filters or []:
+        name, op, value = predicate["column"], predicate["op"], predicate["value"]
+        dtype = dtypes[name]
+        if op == "eq":
+            clauses.append(f"{_ident(name)} = ?")
+            params.append(_param(dtype, value))
+        elif op == "in":
+            clauses.append(f"{_ident(name)} IN ({', '.join('?' for _ in value)})")
+            params += [_param(dtype, v) for v in value]
+        elif op == "contains":
+            clauses.append(f"contains(lower(CAST({_ident(name)} AS VARCHAR)), lower(?))")
+            params.append(str(value))
+        elif op == "between":
+            clauses.append(f"{_ident(name)} BETWEEN ? AND ?")
+            params += [_param(dtype, v) for v in value]
+        else:
+            raise ValueError(f"Unknown filter operator: {op}")
+    return " AND ".join(f"({clause})" for clause in clauses), params
+
+
+def _range_params(dtype, axis_range: list | None) -> list | None:
+    bounds = range_bounds(dtype, axis_range) if axis_range else None
+    if bounds is None:
+        return None
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return [bound.to_pydatetime() for bound in bounds]
+    return list(bounds)
+
+
+def histogram_query(cursor, path: str, dtypes: dict, where: str, params: list, x_axis: str, y_axis: str,
+                    bins: int | None):
+    """Average of y per x bin or per x category, aggregated in the database"""
+    y = f"TRY_CAST({_ident(y_axis)} AS DOUBLE)"
+    if not _is_binnable(dtypes[x_axis]):
+        agg = cursor.execute(
+            f"SELECT {_ident(x_axis)} AS x, avg({y}) AS y FROM read_parquet(?) "
+            f"WHERE {where} AND {_ident(x_axis)} IS NOT NULL GROUP BY 1 ORDER BY 1",
+            [path, *params]).fetchnumpy()
+        return histogram_figure(pd.DataFrame({x_axis: agg["x"], y_axis: agg["y"]}), x_axis, y_axis)
+
+    values = (f"SELECT {_numeric(x_axis, dtypes[x_axis])} AS x, {y} AS y FROM read_parquet(?) "
+              f"WHERE {where} AND {_ident(x_axis)} IS NOT NULL AND {y} IS NOT NULL")
+    low, high, count = cursor.execute(f"SELECT min(x), max(x), count(*) FROM ({values})", [path, *params]).fetchone()
+    if not count:
+        return histogram_figure(pd.DataFrame({x_axis: [], y_axis: []}), x_axis, y_axis)
+
+    bins = max(int(bins or DEFAULT_BINS), 1)
+    width = (high - low) / bins if high > low else 1.0
+    rows = cursor.execute(
+        f"SELECT least(greatest(CAST(floor((x - ?) / ?) AS BIGINT), 0), ?) AS bin, sum(y) AS total, count(*) AS n "
+        f"FROM ({values}) GROUP BY bin",
+        [low, width, bins - 1, path, *params]).fetchnumpy()
+    sums, counts = np.zeros(bins), np.zeros(bins, dtype="int64")
+    sums[rows["bin"]] = rows["total"]
+    counts[rows["bin"]] = rows["n"]
+    agg, width = binned_histogram(x_axis, y_axis, low, width, sums, counts,
+                                  pd.api.types.is_datetime64_any_dtype(dtypes[x_axis]))
+    return histogram_figure(agg, x_axis, y_axis, width)
+
+
+def pie_query(cursor, path: str, where: str, params: list, names: str, values: str | None, top_n: int | None):
+    """Sum of values (or row count) per name, aggregated in the database"""
+    value = f"coalesce(sum(TRY_CAST({_ident(values)} AS DOUBLE)), 0)" if values else "count(*)"
+    agg = cursor.execute(
+        f"SELECT {_ident(names)} AS name, {value} AS value FROM read_parquet(?) "
+        f"WHERE {where} AND {_ident(names)} IS NOT NULL GROUP BY 1 ORDER BY 1",
+        [path, *params]).fetchnumpy()
+    return pie_figure(pd.DataFrame({names: agg["name"], values or "count": agg["value"]}), names, values,
+                      top_n or DEFAULT_TOP_N)
+
+
+def _edges(low: float, high: float, bins: int) -> np.ndarray:
+    # Like numpy.histogram2d, a single value gets a unit wide range around it
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+def scatter_query(cursor, path: str, dtypes: dict, where: str, params: list, x_axis: str, y_axis: str,
+                  x_range: list | None, y_range: list | None, total: int):
+    """Scatter points, or point counts on a grid once there are more than DENSITY_THRESHOLD of them"""
+    x_type, y_type = dtypes[x_axis], dtypes[y_axis]
+    numeric = _is_binnable(x_type) and _is_binnable(y_type)
+    if numeric:
+        for name, dtype, axis_range in ((x_axis, x_type, x_range), (y_axis, y_type, y_range)):
+            bounds = _range_params(dtype, axis_range)
+            if bounds:
+                where += f" AND {_ident(name)} BETWEEN ? AND ?"
+                params = params + bounds
+        count = cursor.execute(f"SELECT count(*) FROM read_parquet(?) WHERE {where}", [path, *params]).fetchone()[0]
+
+        if count > DENSITY_THRESHOLD:
+            values = (f"SELECT {_numeric(x_axis, x_type)} AS x, {_numeric(y_axis, y_type)} AS y FROM read_parquet(?) "
+                      f"WHERE {where}")
+            x_low, x_high, y_low, y_high = cursor.execute(
+                f"SELECT min(x), max(x), min(y), max(y) FROM ({values}) WHERE x IS NOT NULL AND y IS NOT NULL",
+                [path, *params]).fetchone()
+            x_edges, y_edges = _edges(x_low, x_high, DENSITY_BINS), _edges(y_low, y_high, DENSITY_BINS)
+            cells = cursor.execute(
+                f"SELECT least(CAST(floor((x - ?) / ?) AS BIGINT), ?) AS bx, "
+                f"least(CAST(floor((y - ?) / ?) AS BIGINT), ?) AS by, count(*) AS n "
+                f"FROM ({values}) WHERE x IS NOT NULL AND y IS NOT NULL GROUP BY ALL",
+                [x_edges[0], (x_edges[-1] - x_edges[0]) / DENSITY_BINS, DENSITY_BINS - 1,
+                 y_edges[0], (y_edges[-1] - y_edges[0]) / DENSITY_BINS, DENSITY_BINS - 1, path, *params]).fetchnumpy()
+            counts = np.zeros((DENSITY_BINS, DENSITY_BINS))
+            counts[cells["bx"], cells["by"]] = cells["n"]
+            return density_heatmap(counts, x_edges, y_edges, x_axis, y_axis,
+                                   pd.api.types.is_datetime64_any_dtype(x_type), pd.api.types.is_datetime64_any_dtype(y_type))
+
+    points = cursor.execute(f"SELECT {_ident(x_axis)} AS x, {_ident(y_axis)} AS y FROM read_parquet(?) WHERE {where}",
+                            [path, *params]).fetchnumpy()
+    df = pd.DataFrame({x_axis: points["x"], y_axis: points["y"]})
+    return px.scatter(df, x=x_axis, y=y_axis, render_mode="webgl" if total > WEBGL_THRESHOLD else "auto")
+
+
+def line_query(cursor, path: str, dtypes: dict, where: str, params: list, x_axis: str, y_axis: str,
+               x_range: list | None, total: int):
+    """At most LINE_MAX_POINTS points of a line, reduced in the database like charts.minmax_downsample"""
+    ordered = _is_binnable(dtypes[x_axis])
+    # file_row_number keeps ties in dataset order, like the stable sort of the in-memory line chart
+    order = f"{_ident(x_axis)} NULLS LAST, file_row_number" if ordered else "file_row_number"
+    start, stop = 0, total - 1
+    bounds = _range_params(dtypes[x_axis], x_range) if ordered else None
+    if bounds:
+        low, high = bounds
+        below, through = cursor.execute(
+            f"SELECT count(*) FILTER (WHERE {_ident(x_axis)} < ?), count(*) FILTER (WHERE {_ident(x_axis)} <= ?) "
+            f"FROM read_parquet(?) WHERE {where}", [low, high, path, *params]).fetchone()
+        # Keep one point beyond each edge so the line runs up to the border of the view
+        start, stop = max(below - 1, 0), min(through, total - 1)
+
+    buckets = max(LINE_MAX_POINTS // 2, 1)
+    points = cursor.execute(
+        f"""
+        WITH ordered AS (
+            SELECT {_ident(x_axis)} AS x, {_ident(y_axis)} AS y, TRY_CAST({_ident(y_axis)} AS DOUBLE) AS v,
+                   row_number() OVER (ORDER BY {order}) - 1 - ? AS p
+            FROM read_parquet(?, file_row_number = true) WHERE {where}
+        ),
+        visible AS (SELECT * FROM ordered WHERE p BETWEEN 0 AND ?),
+        total AS (SELECT count(*) AS n FROM visible),
+        kept AS (
+            SELECT p FROM visible, total WHERE n <= ?
+            UNION SELECT 0
+            UNION SELECT n - 1 FROM total
+            UNION SELECT arg_min(p, v) FROM visible, total WHERE n > ? GROUP BY p * ? // n
+            UNION SELECT arg_max(p, v) FROM visible, total WHERE n > ? GROUP BY p * ? // n
+        )
+        SELECT x, y FROM visible WHERE p IN (SELECT p FROM kept) ORDER BY p
+        """,
+        [start, path, *params, stop - start, LINE_MAX_POINTS, LINE_MAX_POINTS, buckets, LINE_MAX_POINTS, buckets],
+    ).fetchnumpy()
+    df = pd.DataFrame({x_axis: points["x"], y_axis: points["y"]})
+    return px.line(df, x=x_axis, y=y_axis, render_mode="webgl" if total > WEBGL_THRESHOLD else "auto")
+
+
+@timed("engine_figure")
+def engine_figure(path: str, schema: list, graph_type: str, x_axis: str, y_axis: str | None, bins: int | None = None,
+                  top_n: int | None = None, date_column: str | None = None, start_date=None, end_date=None,
+                  filters: list | None = None, x_range: list | None = None, y_range: list | None = None):
+    """Figure of a sheet's chart settings, computed by DuckDB from a dataset's Parquet copy"""
+    if graph_type not in ENGINE_GRAPH_TYPES:
+        return {}
+    dtypes = _dtypes(schema)
+    where, params = compile_filters(dtypes, date_column, start_date, end_date, filters)
+    cursor = _cursor()
+    try:
+        if graph_type == "histogram":
+            return histogram_query(cursor, path, dtypes, where, params, x_axis, y_axis, bins)
+        if graph_type == "pie":
+            return pie_query(cursor, path, where, params, x_axis, y_axis, top_n)
+        # Rows left after the sheet's filters, which decide between SVG and WebGL like in memory
+        total = cursor.execute(f"SELECT count(*) FROM read_parquet(?) WHERE {where}", [path, *params]).fetchone()[0]
+        if graph_type == "scatter":
+            fig = scatter_query(cursor, path, dtypes, where, params, x_axis, y_axis, x_range, y_range, total)
+        else:
+            fig = line_query(cursor, path, dtypes, where, params, x_axis, y_axis, x_range, total)
+    finally:
+        cursor.close()
+    # Keep the user's zoom across re-renders until the chart itself changes, as build_figure does
+    fig.update_layout(uirevision=f"{graph_type}|{x_axis}|{y_axis}")
+    return fig
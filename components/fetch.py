@@ -0,0 +1,251 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+import zlib
+
+from components.compaction import format_bytes
+from components.datasets import DatasetWriter
+from components.parsing import read_csv_chunks
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+# Downloaded CSVs are kept decoded on disk, and revalidated with ETag / Last-Modified on re-import
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads", "url_cache")
+TIMEOUT_SECONDS = float(os.environ.get("BI_URL_TIMEOUT", "30"))
+MAX_BYTES = int(os.environ.get("BI_URL_MAX_MB", "1024")) * 1024 * 1024
+# Least recently imported copies are removed once the cache holds more than this
+CACHE_MAX_BYTES = int(os.environ.get("BI_URL_CACHE_MB", "2048")) * 1024 * 1024
+READ_BYTES = 1024 * 1024
+CHUNK_ROWS = 100000
+
+ACCEPT_ENCODING = "zstd, gzip" if HAS_ZSTD else "gzip"
+
+logger = logging.getLogger(__name__)
+
+
+class FetchError(Exception):
+    """A URL that cannot be imported: bad scheme, HTTP error, too large or undecodable"""
+
+
+def _cache_paths(url: str) -> tuple[str, str]:
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.csv"), os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def _cached(url: str) -> dict | None:
+    data_path, meta_path = _cache_paths(url)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("url") == url and os.path.exists(data_path) else None
+
+
+def _decoder(encoding: str):
+    """Incremental decompressor for a Content-Encoding (or file suffix), None for identity"""
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return zlib.decompressobj()
+    if encoding == "zstd":
+        if not HAS_ZSTD:
+            raise FetchError("The file is zstd-compressed, install zstandard to import it")
+        return zstandard.ZstdDecompressor().decompressobj()
+    if encoding in ("", "identity"):
+        return None
+    raise FetchError(f"Unsupported content encoding: {encoding}")
+
+
+def _encoding(url: str, response) -> str:
+    encoding = (response.headers.get("Content-Encoding") or "").strip().lower()
+    if encoding:
+        return encoding
+    # Compressed files served as plain bytes
+    path = urllib.parse.urlparse(url).path.lower()
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return ""
+
+
+class _TeeReader(io.RawIOBase):
+    """Decoded response body for the CSV parser, written to the cache file as it is read"""
+
+    def __init__(self, response, decoder, cache_file, max_bytes: int = MAX_BYTES, progress=None):
+        self.response = response
+        self.decoder = decoder
+        self.cache_file = cache_file
+        self.max_bytes = max_bytes
+        self.progress = progress
+        self.downloaded = 0
+        self.decoded = 0
+        self._buffer = b""
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        while not self._buffer and not self._eof:
+            raw = self.response.read(READ_BYTES)
+            if not raw:
+                self._eof = True
+                data = self.decoder.flush() if self.decoder is not None and hasattr(self.decoder, "flush") else b""
+            else:
+                self.downloaded += len(raw)
+                data = self.decoder.decompress(raw) if self.decoder is not None else raw
+            self.decoded += len(data)
+            # Checked on the decoded size too, so a small compressed body cannot expand without bound
+            if self.decoded > self.max_bytes:
+                raise FetchError(f"The file is larger than {format_bytes(self.max_bytes)}")
+            self.cache_file.write(data)
+            self._buffer = data
+            if self.progress and raw:
+                self.progress(self.downloaded)
+
+    def readinto(self, b):
+        self._fill()
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def drain(self):
+        """Read whatever the parser left, so the cache file holds the whole body"""
+        while not self._eof:
+            self._buffer = b""
+            self._fill()
+
+
+def open_url(url: str, cached: dict | None = None, timeout: float = TIMEOUT_SECONDS):
+    """Open a GET request, conditional on the cached validators; returns None for 304 Not Modified"""
+    if urllib.parse.urlparse(url).scheme not in ("http", "https"):
+        raise FetchError("Only http:// and https:// URLs can be imported")
+
+    headers = {"Accept-Encoding": ACCEPT_ENCODING}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    try:
+        response = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached:
+            return None
+        raise FetchError(f"HTTP {e.code} {e.reason}") from e
+    except (urllib.error.URLError, TimeoutError) as e:
+        raise FetchError(f"Could not download {url}: {getattr(e, 'reason', e)}") from e
+
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit() and int(length) > MAX_BYTES:
+        response.close()
+        raise FetchError(f"The file is larger than {format_bytes(MAX_BYTES)}")
+    return response
+
+
+def _append_csv(writer: DatasetWriter, source, chunk_rows: int, infer: bool = True):
+    for chunk in read_csv_chunks(source, chunk_rows=chunk_rows, infer=infer):
+        writer.append(chunk)
+
+
+def _parse_copy(path: str, source: dict | None, chunk_rows: int) -> dict:
+    """Parse a downloaded copy exactly as its download was parsed, so a URL's dtypes never depend on the cache"""
+    writer = DatasetWriter(source)
+    try:
+        _append_csv(writer, path, chunk_rows)
+    except (ValueError, TypeError) as e:
+        # The schema of the first rows did not fit the rest of the file, only the parser's own guesses are left
+        logger.info("Sampled schema did not fit %s, parsing it without: %s", path, e)
+        writer = DatasetWriter(source)
+        _append_csv(writer, path, chunk_rows, infer=False)
+    return writer.finish()
+
+
+def _evict_cache(keep: str):
+    """Remove the least recently imported copies until the cache fits in CACHE_MAX_BYTES"""
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith(".csv"):
+            stat = os.stat(os.path.join(CACHE_DIR, name))
+            entries.append((stat.st_mtime, name, stat.st_size))
+    total = sum(size for _, _, size in entries)
+    for _, name, size in sorted(entries):
+        if total <= CACHE_MAX_BYTES:
+            break
+        data_path = os.path.join(CACHE_DIR, name)
+        if data_path == keep:
+            continue
+        for path in (data_path[:-len(".csv")] + ".json", data_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+
+
+def stream_url(url: str, source: dict | None = None, chunk_rows: int = CHUNK_ROWS, progress=None) -> dict:
+    """Import a CSV URL into the dataset store, parsing it while it downloads
+
+    An unchanged file (304 Not Modified) is parsed from the local copy instead, with the same parser.
+    """
+    cached = _cached(url)
+    response = open_url(url, cached)
+    data_path, meta_path = _cache_paths(url)
+    if response is None:
+        try:
+            handle = _parse_copy(data_path, source, chunk_rows)
+        except FileNotFoundError:
+            # Evicted by another import after it was revalidated, download it again
+            response = open_url(url)
+        else:
+            # Its modification time orders the copies for eviction
+            os.utime(data_path)
+            return handle
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Unique per job, so concurrent imports of the same URL never write the same file
+    part_path = f"{data_path}.{uuid.uuid4().hex}.part"
+    total = response.headers.get("Content-Length")
+    report = (lambda downloaded: progress(downloaded, int(total) if total and total.isdigit() else None)) if progress else None
+
+    try:
+        with response, open(part_path, "wb") as cache_file:
+            tee = _TeeReader(response, _decoder(_encoding(url, response)), cache_file, MAX_BYTES, progress=report)
+            writer = DatasetWriter(source)
+            try:
+                _append_csv(writer, io.BufferedReader(tee, READ_BYTES), chunk_rows)
+            except (ValueError, TypeError):
+                # The sampled schema did not fit, the rest is downloaded and parsed as a cached copy would be
+                writer = None
+            tee.drain()
+        handle = writer.finish() if writer is not None else _parse_copy(part_path, source, chunk_rows)
+    except Exception:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    # The data file is replaced before its validators, so a revalidation never points at older bytes
+    os.replace(part_path, data_path)
+    meta = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "bytes": os.path.getsize(data_path),
+    }
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    _evict_cache(keep=data_path)
+    return handle
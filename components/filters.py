@@ -0,0 +1,180 @@
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from components.cache import index_cache
+from components.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Columns with at most this many distinct values get categorical codes and per-value bitmaps
+LOW_CARDINALITY = 1000
+# Bitmaps kept per column, and the most values an IN-list combines bitmap by bitmap
+MAX_BITMAPS = 32
+
+FILTER_OPERATORS = {
+    "eq": "equals",
+    "in": "is one of",
+    "between": "between",
+    "contains": "contains",
+}
+
+
+class ColumnIndex:
+    """Categorical codes of a low-cardinality column, with per-value bitmaps built on demand"""
+
+    def __init__(self, column: pd.Series):
+        codes, categories = pd.factorize(column, sort=True)
+        if isinstance(categories.dtype, pd.CategoricalDtype):
+            # Compacted text columns factorize to a CategoricalIndex, which is unordered; compare on its plain values
+            categories = np.asarray(categories)
+        self.length = len(codes)
+        self.codes = codes.astype(np.int16 if len(categories) < 2 ** 15 else np.int32)
+        self.categories = pd.Index(categories)
+        self._bitmaps = {}
+        self._lock = threading.Lock()
+
+    @property
+    def max_nbytes(self) -> int:
+        """Upper bound of the memory this index can grow to"""
+        return self.codes.nbytes + MAX_BITMAPS * ((self.length + 7) // 8)
+
+    def bitmap(self, code: int) -> np.ndarray:
+        """Rows holding category code as a packed bitmap (one bit per row)"""
+        with self._lock:
+            bitmap = self._bitmaps.get(code)
+            if bitmap is None:
+                if len(self._bitmaps) >= MAX_BITMAPS:
+                    self._bitmaps.pop(next(iter(self._bitmaps)))
+                bitmap = self._bitmaps[code] = np.packbits(self.codes == code)
+            return bitmap
+
+    def any_of(self, codes) -> np.ndarray:
+        codes = list(codes)
+        if len(codes) > MAX_BITMAPS // 4:
+            # Long IN-lists are cheaper as one pass over the codes
+            return np.packbits(np.isin(self.codes, codes))
+        result = np.zeros((self.length + 7) // 8, dtype=np.uint8)
+        for code in codes:
+            result |= self.bitmap(code)
+        return result
+
+    def codes_for(self, values) -> list:
+        positions = self.categories.get_indexer(pd.Index(values))
+        return [int(code) for code in positions if code >= 0]
+
+
+def column_index(df: pd.DataFrame, key: tuple, column: str) -> ColumnIndex | None:
+    """Cached ColumnIndex of a dataset column, None for high-cardinality columns"""
+    index_key = (*key, column)
+    index = index_cache.get(index_key)
+    if index is None:
+        # Categorical columns already hold their codes, whatever their cardinality
+        categorical = isinstance(df[column].dtype, pd.CategoricalDtype)
+        if not categorical and df[column].nunique(dropna=True) > LOW_CARDINALITY:
+            # Remembered, so the cardinality is only counted once
+            index_cache.put(index_key, False, nbytes=1)
+            return None
+        index = ColumnIndex(df[column])
+        index_cache.put(index_key, index, nbytes=index.max_nbytes)
+    return index or None
+
+
+def _json_value(column: pd.Series, raw_value):
+    # Validated against the column type, but stored in chart-settings-store as plain JSON
+    value = coerce_value(column, raw_value)
+    return value.isoformat() if isinstance(value, pd.Timestamp) else value
+
+
+def coerce_value(column: pd.Series, value):
+    """Convert a value typed into the filter form to the column's type"""
+    if isinstance(value, str):
+        value = value.strip()
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return pd.Timestamp(value)
+    if pd.api.types.is_bool_dtype(column):
+        return str(value).lower() in ("1", "true", "yes")
+    if pd.api.types.is_numeric_dtype(column):
+        return float(value)
+    return value
+
+
+def parse_filter(column: pd.Series, op: str, raw_value: str) -> dict:
+    """Validated predicate from the filter form, raises ValueError for values that do not fit the column"""
+    if op not in FILTER_OPERATORS:
+        raise ValueError(f"Unknown filter operator: {op}")
+    if op == "contains":
+        return {"column": column.name, "op": op, "value": str(raw_value)}
+    if op == "eq":
+        return {"column": column.name, "op": op, "value": _json_value(column, raw_value)}
+    parts = [part for part in str(raw_value).split(",") if part.strip()]
+    if op == "between" and len(parts) != 2:
+        raise ValueError("Between takes two values: low, high")
+    return {"column": column.name, "op": op, "value": [_json_value(column, part) for part in parts]}
+
+
+def _packed(mask: pd.Series) -> np.ndarray:
+    # Nullable and Arrow columns compare to NA for missing values, which never match
+    return np.packbits(mask.to_numpy(dtype=bool, na_value=False))
+
+
+def predicate_bitmap(df: pd.DataFrame, key: tuple, predicate: dict) -> np.ndarray:
+    """Packed bitmap of the rows matching one predicate"""
+    column = df[predicate["column"]]
+    op, value = predicate["op"], predicate["value"]
+    index = column_index(df, key, predicate["column"])
+
+    if index is not None:
+        # Evaluated on the distinct values, then expanded through the per-value bitmaps
+        categories = index.categories
+        if op == "eq":
+            return index.any_of(index.codes_for([coerce_value(column, value)]))
+        if op == "in":
+            return index.any_of(index.codes_for([coerce_value(column, v) for v in value]))
+        if op == "contains":
+            matches = categories.astype(str).str.contains(str(value), case=False, regex=False)
+            return index.any_of(np.flatnonzero(matches))
+        if op == "between":
+            low, high = (coerce_value(column, v) for v in value)
+            return index.any_of(np.flatnonzero((categories >= low) & (categories <= high)))
+
+    if op == "eq":
+        return _packed(column == coerce_value(column, value))
+    if op == "in":
+        return _packed(column.isin([coerce_value(column, v) for v in value]))
+    if op == "contains":
+        return _packed(column.astype(str).str.contains(str(value), case=False, regex=False))
+    if op == "between":
+        low, high = (coerce_value(column, v) for v in value)
+        return _packed(column.between(low, high))
+    raise ValueError(f"Unknown filter operator: {op}")
+
+
+@timed("filter_mask")
+def filter_mask(df: pd.DataFrame, key: tuple, predicates: list) -> np.ndarray | None:
+    """Boolean mask of the rows matching every predicate, None when nothing is filtered"""
+    predicates = [p for p in predicates or [] if p.get("column") in df.columns]
+    if not predicates:
+        return None
+    combined = None
+    for predicate in predicates:
+        try:
+            bitmap = predicate_bitmap(df, key, predicate)
+        except (TypeError, ValueError) as e:
+            # Stored filters can outlive a column's type, e.g. after a refresh; they are skipped, not fatal
+            logger.warning("Skipping filter %s: %s", describe_filter(predicate), e)
+            continue
+        # Combining filters is a bitwise AND over packed bytes
+        combined = bitmap if combined is None else combined & bitmap
+    if combined is None:
+        return None
+    return np.unpackbits(combined, count=len(df)).astype(bool)
+
+
+def describe_filter(predicate: dict) -> str:
+    value = predicate["value"]
+    if isinstance(value, list):
+        value = ", ".join(str(v) for v in value)
+    return f'{predicate["column"]} {FILTER_OPERATORS.get(predicate["op"], predicate["op"])} {value}'
@@ -1,13 +1,49 @@
 from dash import html, dcc
 import dash_bootstrap_components as dbc
 from dash import callback, Input, Output, State, dash_table, no_update
-import pandas as pd
-import base64
-import io
-import threading
-from sqlalchemy import create_engine
+import functools
+import logging
+import os
+import time
+from components.datasets import register_dataset, dataset_memory_report
+from components.metrics import record_import
+from components.uploads import uploaded_file_path
+from components.connections import source_connection
+from components.sql_import import stream_table
+from components.fetch import stream_url
+from components.parsing import read_csv, read_excel, parse_dtype_spec, parse_column_list
 
-lock = threading.Lock()
+
+# Shared options of the import callbacks, which run as background jobs with a progress bar and a cancel button
+IMPORT_JOB_OPTIONS = dict(
+    background=True,
+    running=[
+        (Output("import-progress", "style"), {"display": "block"}, {"display": "none"}),
+        (Output("cancel-import", "disabled"), False, True),
+    ],
+    progress=[Output("import-progress-bar", "value"), Output("import-progress-bar", "label")],
+    progress_default=[0, ""],
+    cancel=[Input("cancel-import", "n_clicks")],
+)
+
+logger = logging.getLogger(__name__)
+
+
+def instrument_import(source_type: str):
+    """Time an import callback and record the throughput of the dataset it returns"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            handle = result[0] if isinstance(result, tuple) else result
+            if isinstance(handle, dict) and "dataset_id" in handle:
+                # Measured on the parsed data, so file, database and URL imports compare
+                nbytes = sum(col["bytes_before"] for col in dataset_memory_report(handle))
+                record_import(source_type, handle["rows"], nbytes, time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorator
 
 
 # the style arguments for the sidebar. We use position:fixed and a fixed width
@@ -50,10 +86,22 @@ sidebar = html.Div(
                 dbc.Modal(
                 [
                     dbc.ModalHeader("Upload File"),
-                    dbc.ModalBody(
-                        dcc.Upload(
+                    dbc.ModalBody([
+                        dbc.Row([
+                            dbc.Label("Column Types:", width=4),
+                            dbc.Col(dcc.Input(type="text", id="dtype-input", placeholder="price:float64, region:category"), width=8)
+                        ], className="mb-3"),
+                        dbc.Row([
+                            dbc.Label("Date Columns:", width=4),
+                            dbc.Col(dcc.Input(type="text", id="date-columns-input", placeholder="date, created_at"), width=8)
+                        ], className="mb-3"),
+                        html.Div(
+                            [
+                                # Picked or dropped files are streamed to /upload by assets/chunked_upload.js
+                                html.Div(['Drag and Drop or Click to Upload File'], id='upload-text'),
+                                dcc.Store(id='upload-complete-store'),
+                            ],
                             id='upload-in-modal',
-                            children=html.Div(['Drag and Drop or Click to Upload File'], id='upload-text'),
                             style={
                                 'width': '100%',
                                 'height': '100px',
@@ -62,10 +110,10 @@ sidebar = html.Div(
                                 'borderStyle': 'dashed',
                                 'borderRadius': '5px',
                                 'textAlign': 'center',
+                                'cursor': 'pointer',
                             },
-                            multiple=False
                             )
-                        ),
+                        ]),
                     dbc.ModalFooter(
                         dbc.Button("Done", id="submit-csv", n_clicks=0)
                     )
@@ -122,6 +170,27 @@ sidebar = html.Div(
                                 dbc.Col(dcc.Input(type="text", id="search-input"), width=9)
                             ], className="mb-3", style={"align-items": "center"}),
 
+                            dbc.Row([
+                                dbc.Label("Columns:", width=3),
+                                dbc.Col(dcc.Input(type="text", id="db-columns-input", placeholder="All columns"), width=9)
+                            ], className="mb-3", style={"align-items": "center"}),
+
+                            dbc.Row([
+                                dbc.Label("Row Limit:", width=3),
+                                dbc.Col(dcc.Input(type="number", id="db-limit-input", min=1, placeholder="No limit"), width=9)
+                            ], className="mb-3", style={"align-items": "center"}),
+
+                            dbc.Row([
+                                dbc.Label("Sample %:", width=3),
+                                dbc.Col(dcc.Input(type="number", id="db-sample-input", min=0, max=100, placeholder="100"), width=9)
+                            ], className="mb-3", style={"align-items": "center"}),
+
+                            dbc.Row([
+                                dbc.Label("Watermark:", width=3),
+                                dbc.Col(dcc.Input(type="text", id="db-watermark-input", placeholder="id or updated_at, enables refresh"), width=9)
+                            ], className="mb-3", style={"align-items": "center"}),
+
+                            dbc.Switch(id="db-live-switch", label="Live query: compute histogram and pie charts on MySQL", value=False),
 
                         ]),
                     ),
@@ -169,6 +238,15 @@ sidebar = html.Div(
             ],
             vertical=True,
         ),
+        # Imports run as background jobs, their progress is shown here
+        html.Div(
+            [
+                dbc.Progress(id="import-progress-bar", value=0, striped=True, animated=True, className="mb-2"),
+                dbc.Button("Cancel Import", id="cancel-import", color="danger", size="sm", disabled=True),
+            ],
+            id="import-progress",
+            style={"display": "none"},
+        ),
     ],
     style=SIDEBAR_STYLE,
 )
@@ -186,34 +264,53 @@ def toggle_csv_modal(open_clicks, close_clicks, is_open):
 # Get CSV file content
 @callback(Output('uploaded-data-store', 'data', allow_duplicate=True),
           Output('upload-text', 'children'),
-              Input('upload-in-modal', 'contents'),
-              State('upload-in-modal', 'filename'),
-              State('upload-in-modal', 'last_modified'),
-              prevent_initial_call=True)
-def update_csv_output(contents, filename, date):
+              Input('upload-complete-store', 'data'),
+              State('dtype-input', 'value'),
+              State('date-columns-input', 'value'),
+              prevent_initial_call=True,
+              **IMPORT_JOB_OPTIONS)
+@instrument_import("file")
+def update_csv_output(set_progress, upload, dtype_spec=None, date_columns_spec=None):
 
-    if contents is None:
+    if not upload:
         return no_update, "No file uploaded"
     
-    content_type, content_string = contents.split(',')
+    filename = upload["filename"]
+    try:
+        path = uploaded_file_path(upload["upload_id"], filename)
+    except ValueError as e:
+        logger.warning("Rejected upload: %s", e)
+        return no_update, "No file uploaded"
 
-    decoded = base64.b64decode(content_string)
     try:
-        if 'csv' in filename:
+        dtypes = parse_dtype_spec(dtype_spec)
+        date_columns = parse_column_list(date_columns_spec)
+        set_progress((30, f'Parsing "{filename}"'))
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == '.csv':
             # Assume that the user uploaded a CSV file
-            df = pd.read_csv(
-                io.StringIO(decoded.decode('utf-8')))
-        elif 'xls' in filename:
+            df = read_csv(path, dtypes, date_columns)
+        elif extension in ('.xls', '.xlsx'):
             # Assume that the user uploaded an excel file
-            df = pd.read_excel(io.BytesIO(decoded))
-    except Exception as e:
-        print(e)
+            df = read_excel(path, dtypes, date_columns)
+        else:
+            logger.warning('Unsupported file type "%s"', filename)
+            return no_update, html.Div([
+                'There was an error processing this file.'
+            ])
+    except Exception:
+        logger.exception('Could not parse "%s"', filename)
         return no_update, html.Div([
             'There was an error processing this file.'
         ])
-    print(df.columns)
+    finally:
+        # The dataset registry keeps its own copy, the raw upload is no longer needed
+        if os.path.exists(path):
+            os.remove(path)
+    logger.debug("Parsed %s with columns %s", filename, list(df.columns))
 
-    return df.to_dict('records'), f'File "{filename}" uploaded successfully!'
+    set_progress((80, f"Storing {len(df):,} rows"))
+    return register_dataset(df, {"type": "file", "filename": filename}), f'File "{filename}" uploaded successfully!'
 
 @callback(
     Output("db-modal", "is_open"),
@@ -236,19 +333,49 @@ def toggle_database_modal(open_clicks, submit_clicks, is_open):
     State("password-input", "value"),
     State("db-name-input", "value"),
     State("search-input", "value"),
-    prevent_initial_call=True
+    State("db-columns-input", "value"),
+    State("db-limit-input", "value"),
+    State("db-sample-input", "value"),
+    State("db-live-switch", "value"),
+    State("db-watermark-input", "value"),
+    prevent_initial_call=True,
+    **IMPORT_JOB_OPTIONS
 )
-def update_database_output(n_clicks, host, port, username, password, db_name, table):
-    with lock:
-        try:
-            if n_clicks:
-                connection_string = f'mysql+pymysql://{username}:{password}@{host}:{port}/{db_name}'
-                engine = create_engine(connection_string)
-                df = pd.read_sql(f"SELECT * FROM {table};", con=engine)
-                return df.to_dict('records')
-        except Exception as e:
-            print(e)
-            return no_update
+@instrument_import("mysql")
+def update_database_output(set_progress, n_clicks, host, port, username, password, db_name, table,
+                           columns=None, limit=None, sample_percent=None, live=False, watermark=None):
+    try:
+        if n_clicks:
+            columns = parse_column_list(columns) or None
+            watermark = (watermark or "").strip() or None
+            if watermark and columns and watermark not in columns:
+                # Refreshes compare against the imported watermark values
+                columns.append(watermark)
+            sample = sample_percent / 100 if sample_percent and sample_percent < 100 else None
+            source = {"type": "mysql", "host": host, "port": port, "username": username,
+                      "database": db_name, "table": table, "live": bool(live),
+                      "columns": columns, "limit": limit, "sample": sample, "watermark": watermark}
+            def report(rows, nbytes):
+                status = f"{rows:,} rows ({nbytes / 1024 / 1024:.1f} MB)"
+                set_progress((min(100 * rows // limit, 100) if limit else 100, status))
+
+            set_progress((0, "Connecting..."))
+            # Pooled per source, imports from different sessions run in parallel
+            with source_connection(host, port, username, password, db_name) as connection:
+                return stream_table(
+                    connection,
+                    table,
+                    columns=columns,
+                    limit=limit,
+                    sample=sample,
+                    source=source,
+                    # Live queries and refreshes reconnect later, so the password has to stay on the server
+                    secrets={"password": password} if live or watermark else None,
+                    progress=report,
+                )
+    except Exception:
+        logger.exception("Database import of %s failed", table)
+        return no_update
 
 @callback(
     Output("url-modal", "is_open"),
@@ -266,15 +393,20 @@ def toggle_url_modal(open_clicks, submit_clicks, is_open):
     Output("uploaded-data-store", "data", allow_duplicate=True),
     Input("submit-url", "n_clicks"),
     State("url-input", "value"),
-    prevent_initial_call=True
+    prevent_initial_call=True,
+    **IMPORT_JOB_OPTIONS
 )
-def update_url_output(n_clicks, url):
-    with lock:
-        try:
-            if n_clicks:
-                df = pd.read_csv(url)
-                print(df.columns)
-                return df.to_dict('records')
-        except Exception as e:
-            print(e)
-            return no_update
+@instrument_import("url")
+def update_url_output(set_progress, n_clicks, url):
+    try:
+        if n_clicks:
+            def report(downloaded, total):
+                status = f"Downloading {downloaded / 1024 / 1024:.1f} MB"
+                set_progress((min(100 * downloaded // total, 100) if total else 100, status))
+
+            set_progress((0, "Connecting..."))
+            # Parsed while downloading; an unchanged file is revalidated and read from the local copy
+            return stream_url(url, {"type": "url", "url": url}, progress=report)
+    except Exception:
+        logger.exception("URL import of %s failed", url)
+        return no_update
@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the app only runs as a single process
+    fcntl = None
+
+# Whether file locks hold across processes; without them callers fall back to locks of their own process
+HAS_FILE_LOCKS = fcntl is not None
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True):
+    """Exclusive lock on a lock file, against every thread and process locking the same path
+
+    Yields whether the lock is held, which is only False when blocking=False and someone else holds it.
+    flock belongs to the open file, so threads of one process also exclude each other,
+    and the kernel releases it when the process holding it dies.
+    """
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,264 @@
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import diskcache
+from flask import Response, g, request
+
+from components.cache import figure_cache, frame_cache, index_cache, layout_cache, view_cache
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CACHES = {"frame": frame_cache, "figure": figure_cache, "layout": layout_cache, "view": view_cache, "index": index_cache}
+
+# Callbacks slower than this are profiled by sampling their thread's stack; unset to turn the profiler off
+PROFILE_SLOW_MS = float(os.environ["BI_PROFILE_SLOW_MS"]) if os.environ.get("BI_PROFILE_SLOW_MS") else None
+PROFILE_INTERVAL_SECONDS = float(os.environ.get("BI_PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads", "profiles")
+
+# Imports run in background job processes, so their counters are shared through a small disk store
+_shared = diskcache.Cache(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads", "metrics"))
+
+
+class Histogram:
+    """Prometheus-style duration histogram, one series per label"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label: str, value: float):
+        with self._lock:
+            counts, total, count = self._series.get(label, ([0] * len(self.buckets), 0.0, 0))
+            counts = [n + (value <= bound) for n, bound in zip(counts, self.buckets)]
+            self._series[label] = (counts, total + value, count + 1)
+
+    def samples(self) -> dict:
+        with self._lock:
+            return dict(self._series)
+
+
+class Counters:
+    """Counters, one per label"""
+
+    def __init__(self):
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, label: str = "", value: float = 1):
+        with self._lock:
+            self._values[label] += value
+
+    def samples(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+
+callback_seconds = Histogram()
+callback_request_bytes = Counters()
+callback_response_bytes = Counters()
+slow_callbacks = Counters()
+function_seconds = Histogram()
+frame_loads = Counters()
+dashboard_timeouts = Counters()
+
+
+def timed(name: str):
+    """Record the duration of every call of a hot-path function"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                function_seconds.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def record_import(source_type: str, rows: int, nbytes: int, seconds: float):
+    """Count an import and its throughput, from whichever process ran it"""
+    _shared.incr(("imports", source_type))
+    _shared.incr(("import_rows", source_type), int(rows))
+    _shared.incr(("import_bytes", source_type), int(nbytes))
+    _shared.incr(("import_ms", source_type), int(seconds * 1000))
+    _shared.set(("last_import", source_type), {
+        "rows_per_second": rows / seconds if seconds else 0.0,
+        "megabytes_per_second": nbytes / 1024 / 1024 / seconds if seconds else 0.0,
+    })
+
+
+class SlowCallbackProfiler:
+    """Samples the stacks of running callbacks and reports those that took longer than PROFILE_SLOW_MS"""
+
+    def __init__(self, threshold_ms: float, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._sample, name="slow-callback-profiler", daemon=True).start()
+
+    def start(self):
+        with self._lock:
+            self._active[threading.get_ident()] = (time.perf_counter(), Counter())
+
+    def stop(self, name: str):
+        with self._lock:
+            started, stacks = self._active.pop(threading.get_ident(), (None, None))
+        if started is None or time.perf_counter() - started < self.threshold or not stacks:
+            return
+        slow_callbacks.inc(name)
+        self._report(name, time.perf_counter() - started, stacks)
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, (started, stacks) in self._active.items():
+                    # Callbacks are only sampled once they are halfway to the threshold
+                    frame = frames.get(ident)
+                    if frame is None or now - started < self.threshold / 2:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                        frame = frame.f_back
+                    stacks[";".join(reversed(stack))] += 1
+
+    def _report(self, name: str, seconds: float, stacks: Counter):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}.folded")
+        # Collapsed stacks, readable by flamegraph.pl and speedscope
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        top = stacks.most_common(1)[0][0].rsplit(";", 3)
+        logger.warning("Slow callback %s took %.0f ms, hottest stack ends in %s, profile saved to %s",
+                       name, seconds * 1000, " > ".join(top[-3:]), path)
+
+
+profiler = SlowCallbackProfiler(PROFILE_SLOW_MS) if PROFILE_SLOW_MS else None
+
+
+def _callback_name(app, body: dict | None) -> str:
+    output = (body or {}).get("output", "")
+    func = app.callback_map.get(output, {}).get("callback")
+    return getattr(func, "__name__", None) or output or "unknown"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(name: str, label: str, histogram: Histogram) -> list:
+    lines = []
+    for value, (counts, total, count) in sorted(histogram.samples().items()):
+        tag = f'{label}="{_escape(value)}"'
+        for bound, n in zip(histogram.buckets, counts):
+            lines.append(f'{name}_bucket{{{tag},le="{bound}"}} {n}')
+        lines.append(f'{name}_bucket{{{tag},le="+Inf"}} {count}')
+        lines.append(f"{name}_sum{{{tag}}} {total}")
+        lines.append(f"{name}_count{{{tag}}} {count}")
+    return lines
+
+
+def _counter_lines(name: str, label: str, counters: dict) -> list:
+    if not label:
+        return [f"{name} {counters.get('', 0)}"]
+    return [f'{name}{{{label}="{_escape(value)}"}} {n}' for value, n in sorted(counters.items())]
+
+
+def _metric(name: str, kind: str, help_text: str, lines: list) -> list:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *lines]
+
+
+def render_metrics() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    lines += _metric("bi_callback_duration_seconds", "histogram", "Time to run a Dash callback request",
+                     _histogram_lines("bi_callback_duration_seconds", "callback", callback_seconds))
+    lines += _metric("bi_callback_request_bytes_total", "counter", "Request payload bytes per callback",
+                     _counter_lines("bi_callback_request_bytes_total", "callback", callback_request_bytes.samples()))
+    lines += _metric("bi_callback_response_bytes_total", "counter", "Response payload bytes per callback",
+                     _counter_lines("bi_callback_response_bytes_total", "callback", callback_response_bytes.samples()))
+    lines += _metric("bi_slow_callbacks_total", "counter", "Callbacks slower than BI_PROFILE_SLOW_MS",
+                     _counter_lines("bi_slow_callbacks_total", "callback", slow_callbacks.samples()))
+    lines += _metric("bi_function_duration_seconds", "histogram", "Time spent in instrumented hot-path functions",
+                     _histogram_lines("bi_function_duration_seconds", "function", function_seconds))
+    lines += _metric("bi_frame_loads_total", "counter", "DataFrames loaded from disk because they were not cached",
+                     _counter_lines("bi_frame_loads_total", "", frame_loads.samples()))
+    lines += _metric("bi_dashboard_timeouts_total", "counter", "Dashboard charts not computed within BI_SHEET_TIMEOUT",
+                     _counter_lines("bi_dashboard_timeouts_total", "", dashboard_timeouts.samples()))
+
+    stats = {name: cache.stats() for name, cache in CACHES.items()}
+    for key, kind, help_text in (
+        ("hits", "counter", "Cache lookups that found an entry"),
+        ("misses", "counter", "Cache lookups that found nothing"),
+        ("evictions", "counter", "Entries evicted to stay within the memory budget"),
+        ("hit_rate", "gauge", "Share of lookups that were hits"),
+        ("entries", "gauge", "Entries held"),
+        ("bytes", "gauge", "Bytes held"),
+        ("max_bytes", "gauge", "Memory budget"),
+    ):
+        name = f"bi_cache_{key}_total" if kind == "counter" else f"bi_cache_{key}"
+        lines += _metric(name, kind, help_text, [f'{name}{{cache="{cache}"}} {s[key]}' for cache, s in stats.items()])
+
+    imports = {}
+    for key in _shared.iterkeys():
+        imports.setdefault(key[0], {})[key[1]] = _shared.get(key)
+    for key, name, help_text, scale in (
+        ("imports", "bi_imports_total", "Completed imports", 1),
+        ("import_rows", "bi_import_rows_total", "Rows imported", 1),
+        ("import_bytes", "bi_import_bytes_total", "Bytes of parsed data imported", 1),
+        ("import_ms", "bi_import_seconds_total", "Time spent importing", 1000),
+    ):
+        lines += _metric(name, "counter", help_text,
+                         [f'{name}{{source="{source}"}} {value / scale}' for source, value in sorted(imports.get(key, {}).items())])
+    for key, help_text in (("rows_per_second", "Rows per second of the latest import"),
+                           ("megabytes_per_second", "Parsed megabytes per second of the latest import")):
+        name = f"bi_last_import_{key}"
+        lines += _metric(name, "gauge", help_text,
+                         [f'{name}{{source="{source}"}} {last[key]}' for source, last in sorted(imports.get("last_import", {}).items())])
+    return "\n".join(lines) + "\n"
+
+
+def register_metrics_routes(app):
+    """Time every callback request and serve the metrics at /metrics"""
+    server = app.server
+
+    @server.before_request
+    def start_callback_timer():
+        if request.path.endswith("/_dash-update-component"):
+            g.callback_started = time.perf_counter()
+            if profiler:
+                profiler.start()
+
+    @server.after_request
+    def record_callback(response):
+        started = g.pop("callback_started", None)
+        if started is None:
+            return response
+        name = g.callback_name = _callback_name(app, request.get_json(silent=True))
+        callback_seconds.observe(name, time.perf_counter() - started)
+        callback_request_bytes.inc(name, request.content_length or 0)
+        callback_response_bytes.inc(name, response.calculate_content_length() or 0)
+        return response
+
+    @server.teardown_request
+    def stop_profiler(exc):
+        # Also reached when the callback raised, so no thread is left registered
+        if profiler and request.path.endswith("/_dash-update-component"):
+            profiler.stop(g.get("callback_name") or _callback_name(app, request.get_json(silent=True)))
+
+    @server.route("/metrics")
+    def metrics():
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,171 @@
+import datetime
+import io
+import itertools
+import logging
+import os
+
+import pandas as pd
+from openpyxl import load_workbook
+
+try:
+    import pyarrow  # noqa: F401  # enables the multithreaded pyarrow CSV engine
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+logger = logging.getLogger(__name__)
+
+# Rows read up front to infer the schema, instead of letting the parser guess from the whole file
+SAMPLE_ROWS = 10000
+EXCEL_CHUNK_ROWS = 50000
+CSV_CHUNK_ROWS = 100000
+READ_BYTES = 1024 * 1024
+
+
+def parse_dtype_spec(spec: str | None) -> dict:
+    """Parse user-declared column types written as "column:dtype, column:dtype" """
+    dtypes = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        if ":" not in part:
+            raise ValueError(f'Column type "{part.strip()}" must be written as column:dtype')
+        column, dtype = (value.strip() for value in part.rsplit(":", 1))
+        pd.api.types.pandas_dtype(dtype)
+        dtypes[column] = dtype
+    return dtypes
+
+
+def parse_column_list(spec: str | None) -> list:
+    """Parse a comma separated list of column names"""
+    return [part.strip() for part in (spec or "").split(",") if part.strip()]
+
+
+def infer_schema(source, dtypes: dict | None = None, date_columns: list | None = None) -> dict:
+    """Infer column dtypes from the first SAMPLE_ROWS rows, user declarations win"""
+    sample = pd.read_csv(source, nrows=SAMPLE_ROWS, dtype=dtypes or None)
+    schema = {}
+    for column, dtype in sample.dtypes.items():
+        if column in (date_columns or []):
+            continue
+        # Text columns are left to the engine, only clearly typed columns are pinned
+        if pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+            schema[column] = str(dtype)
+    schema.update(dtypes or {})
+    return schema
+
+
+def _read_csv_pyarrow(source, schema: dict, date_columns: list) -> pd.DataFrame:
+    # pyarrow decodes column blocks on all cores
+    df = pd.read_csv(source, engine="pyarrow", dtype=schema or None, parse_dates=date_columns or None)
+    # pyarrow detects ISO dates on its own but hands them over as datetime.date objects
+    for column in df.columns[df.dtypes == object]:
+        first = df[column].first_valid_index()
+        if first is not None and isinstance(df[column][first], datetime.date):
+            df[column] = pd.to_datetime(df[column])
+    return df
+
+
+def _read_csv_c(source, schema: dict, date_columns: list) -> pd.DataFrame:
+    return pd.read_csv(source, engine="c", dtype=schema or None, parse_dates=date_columns or None)
+
+
+PARSE_ENGINES = {
+    "pyarrow": _read_csv_pyarrow,
+    "c": _read_csv_c,
+}
+DEFAULT_ENGINE = os.environ.get("BI_PARSE_ENGINE", "pyarrow" if HAS_PYARROW else "c")
+
+
+def read_csv(source, dtypes: dict | None = None, date_columns: list | None = None, engine: str | None = None) -> pd.DataFrame:
+    """Read a CSV file or URL with the configured parse engine and a sampled schema"""
+    read = PARSE_ENGINES[engine or DEFAULT_ENGINE]
+    date_columns = date_columns or []
+
+    schema = infer_schema(source, dtypes, date_columns)
+    try:
+        return read(source, schema, date_columns)
+    except (ValueError, TypeError) as e:
+        # The sample did not represent the whole file, only keep what the user declared
+        logger.info("Inferred schema did not fit the file, retrying without it: %s", e)
+        return read(source, dtypes or {}, date_columns)
+
+
+class _Prefixed(io.RawIOBase):
+    """A stream with the bytes already read from it put back in front"""
+
+    def __init__(self, head: bytes, stream):
+        self._head = head
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._head[:len(b)] if self._head else self._stream.read(len(b))
+        self._head = self._head[len(data):]
+        b[:len(data)] = data
+        return len(data)
+
+
+def read_csv_chunks(source, dtypes: dict | None = None, date_columns: list | None = None,
+                    chunk_rows: int = CSV_CHUNK_ROWS, infer: bool = True):
+    """Read a CSV file or binary stream chunk by chunk, typed by the schema of its first SAMPLE_ROWS rows
+
+    A stream is only read once: the sample is read ahead, then parsed again as part of the first chunk.
+    With infer=False only the declared dtypes are applied.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield from read_csv_chunks(f, dtypes, date_columns, chunk_rows, infer)
+        return
+
+    date_columns = date_columns or []
+    schema = dict(dtypes or {})
+    if infer:
+        head = b"".join(itertools.islice(source, SAMPLE_ROWS + 1))
+        try:
+            schema = infer_schema(io.BytesIO(head), dtypes, date_columns)
+        except (ValueError, TypeError) as e:
+            logger.info("Could not infer a schema from the first rows: %s", e)
+        source = io.BufferedReader(_Prefixed(head, source), READ_BYTES)
+    # The C parser is the one that reads in chunks
+    with pd.read_csv(source, engine="c", dtype=schema or None, parse_dates=date_columns or None,
+                     chunksize=chunk_rows) as reader:
+        yield from reader
+
+
+def read_excel(path: str, dtypes: dict | None = None, date_columns: list | None = None) -> pd.DataFrame:
+    """Read the first sheet of an .xlsx workbook with openpyxl's streaming read-only mode"""
+    if path.lower().endswith(".xls"):
+        # openpyxl only reads the xlsx format
+        df = pd.read_excel(path)
+    else:
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return pd.DataFrame()
+            columns = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+
+            chunks = []
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= EXCEL_CHUNK_ROWS:
+                    chunks.append(pd.DataFrame.from_records(chunk, columns=columns))
+                    chunk = []
+            if chunk or not chunks:
+                chunks.append(pd.DataFrame.from_records(chunk, columns=columns))
+        finally:
+            workbook.close()
+
+        df = pd.concat(chunks, ignore_index=True).infer_objects()
+
+    if dtypes:
+        df = df.astype(dtypes)
+    for column in date_columns or []:
+        df[column] = pd.to_datetime(df[column])
+    return df
+
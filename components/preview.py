@@ -0,0 +1,181 @@
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+
+from components.cache import view_cache
+from components.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+FILTER_OPERATORS = [
+    ["ge ", ">="],
+    ["le ", "<="],
+    ["lt ", "<"],
+    ["gt ", ">"],
+    ["ne ", "!="],
+    ["eq ", "="],
+    ["contains "],
+    ["datestartswith "],
+]
+
+
+def split_filter_part(filter_part: str):
+    """Split one DataTable filter expression into (column, operator, value)"""
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find("{") + 1: name_part.rfind("}")]
+
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ""
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', "`"):
+                    value = value_part[1:-1].replace("\\" + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                # Word operators need spaces after them in the filter string,
+                # but we don't want these later
+                return name, operator_type[0].strip(), value
+
+    return [None] * 3
+
+
+def _filter_text(value) -> str:
+    # split_filter_part reads bare numbers as floats, so 5 would otherwise be compared as "5.0"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _filter_value(dtype, value):
+    """A comparison value in a column's type, raises ValueError when the value has none"""
+    if isinstance(dtype, pd.CategoricalDtype):
+        if dtype.categories.dtype == object:
+            # Compaction only makes categoricals of text columns
+            return _filter_text(value)
+        dtype = dtype.categories.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return pd.Timestamp(_filter_text(value))
+    if pd.api.types.is_bool_dtype(dtype):
+        return _filter_text(value).lower() in ("1", "true", "yes")
+    if pd.api.types.is_numeric_dtype(dtype):
+        return float(value)
+    if pd.api.types.is_string_dtype(dtype) and dtype != object:
+        return _filter_text(value)
+    # Object columns can hold anything, their values are compared as typed
+    return value
+
+
+def _compare(column: pd.Series, operator: str, filter_value) -> pd.Series:
+    value = _filter_value(column.dtype, filter_value)
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Compare the distinct values once, then look every row up by its code
+        matches = getattr(pd.Series(column.cat.categories), operator)(value).to_numpy(dtype=bool, na_value=False)
+        codes = column.cat.codes.to_numpy()
+        return pd.Series(np.where(codes >= 0, matches[codes], False))
+    return getattr(column, operator)(value)
+
+
+def _filter_mask(df: pd.DataFrame, filter_query: str) -> np.ndarray | None:
+    mask = None
+    for filter_part in filter_query.split(" && "):
+        col_name, operator, filter_value = split_filter_part(filter_part)
+        if col_name not in df.columns:
+            continue
+        column = df[col_name]
+        try:
+            if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
+                part = _compare(column, operator, filter_value)
+            elif operator == "contains":
+                part = column.astype(str).str.contains(str(filter_value), regex=False)
+            elif operator == "datestartswith":
+                part = column.astype(str).str.startswith(str(filter_value))
+            else:
+                continue
+        except (TypeError, ValueError) as e:
+            # A value the column cannot be compared with filters nothing, rather than failing the page
+            logger.debug("Skipping preview filter %r: %s", filter_part, e)
+            continue
+        part = part.to_numpy(dtype=bool, na_value=False)
+        mask = part if mask is None else mask & part
+    return mask
+
+
+def _view_order(df: pd.DataFrame, key, sort_by: list, filter_query: str) -> np.ndarray | None:
+    """Row positions of the filtered and sorted view, or None for the unmodified table"""
+    if not sort_by and not filter_query:
+        return None
+
+    cache_key = (*key, tuple((s["column_id"], s["direction"]) for s in sort_by), filter_query)
+    order = view_cache.get(cache_key)
+    if order is not None:
+        return order
+
+    mask = _filter_mask(df, filter_query) if filter_query else None
+    order = np.flatnonzero(mask) if mask is not None else np.arange(len(df))
+
+    sort_by = [s for s in sort_by if s["column_id"] in df.columns]
+    if sort_by:
+        # Sort positions using only the sort keys, the other columns are never copied
+        keys = df[[s["column_id"] for s in sort_by]]
+        if mask is not None:
+            keys = keys.iloc[order]
+        positions = keys.reset_index(drop=True).sort_values(
+            [s["column_id"] for s in sort_by],
+            ascending=[s["direction"] == "asc" for s in sort_by],
+            kind="stable",
+            na_position="last",
+        ).index.to_numpy()
+        order = order[positions]
+
+    return view_cache.put(cache_key, order)
+
+
+def format_page(page: pd.DataFrame) -> list:
+    """Coerce a page of rows into JSON-friendly records, one column at a time"""
+    formatted = {}
+    for col in page.columns:
+        column = page[col]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            date_only = bool((column.dropna().dt.normalize() == column.dropna()).all())
+            values = column.dt.strftime("%Y-%m-%d" if date_only else "%Y-%m-%d %H:%M:%S")
+        elif pd.api.types.is_bool_dtype(column) or pd.api.types.is_numeric_dtype(column):
+            values = column
+        else:
+            values = column.astype(object)
+            basic = values.map(lambda v: isinstance(v, (int, float, str, bool)))
+            values = values.where(basic | values.isna(), values.astype(str))
+        formatted[str(col)] = values.astype(object).where(column.notna(), None).tolist()
+
+    return [dict(zip(formatted, row)) for row in zip(*formatted.values())]
+
+
+def column_type(dtype) -> str:
+    """DataTable column type for a pandas dtype"""
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+        return "numeric"
+    return "text"
+
+
+@timed("query_page")
+def query_page(df: pd.DataFrame, key, page_current: int, page_size: int, sort_by: list | None, filter_query: str | None):
+    """Slice one page of the filtered and sorted view, returning (records, page_count)"""
+    order = _view_order(df, key, sort_by or [], filter_query or "")
+    total = len(df) if order is None else len(order)
+
+    start = page_current * page_size
+    stop = start + page_size
+    if order is None:
+        page = df.iloc[start:stop]
+    else:
+        page = df.iloc[order[start:stop]]
+
+    return format_page(page), max(math.ceil(total / page_size), 1)
@@ -0,0 +1,70 @@
+import pandas as pd
+
+# Text columns with at most this many distinct values are treated as categories
+CATEGORY_LIMIT = 1000
+TOP_VALUES = 5
+
+# Column kinds each chart accepts on its X and Y axis
+AXIS_KINDS = {
+    "histogram": ({"numeric", "temporal", "categorical", "boolean"}, {"numeric", "boolean"}),
+    "pie": ({"categorical", "boolean", "numeric"}, {"numeric", "boolean"}),
+    "scatter": ({"numeric", "temporal", "categorical", "boolean"}, {"numeric", "temporal"}),
+    "line": ({"numeric", "temporal", "categorical"}, {"numeric"}),
+}
+
+
+def _json_scalar(value):
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value.item() if hasattr(value, "item") else value
+
+
+def column_kind(column: pd.Series, distinct: int) -> str:
+    if pd.api.types.is_bool_dtype(column):
+        return "boolean"
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return "temporal"
+    if pd.api.types.is_numeric_dtype(column):
+        return "numeric"
+    if isinstance(column.dtype, pd.CategoricalDtype) or distinct <= CATEGORY_LIMIT:
+        return "categorical"
+    return "text"
+
+
+def profile_column(name: str, column: pd.Series) -> dict:
+    distinct = int(column.nunique(dropna=True))
+    kind = column_kind(column, distinct)
+    profile = {
+        "name": name,
+        "dtype": str(column.dtype),
+        "kind": kind,
+        "nulls": int(column.isna().sum()),
+        "distinct": distinct,
+        "min": None,
+        "max": None,
+        "top": [],
+    }
+    if kind in ("numeric", "temporal") and distinct:
+        profile["min"] = _json_scalar(column.min())
+        profile["max"] = _json_scalar(column.max())
+    if kind in ("categorical", "boolean", "text"):
+        counts = column.value_counts(dropna=True).head(TOP_VALUES)
+        profile["top"] = [[str(value), int(count)] for value, count in counts.items()]
+    return profile
+
+
+def profile_frame(df: pd.DataFrame) -> list:
+    """Dtype, kind, null count, cardinality, min/max and top values of every column"""
+    return [profile_column(col, df[col]) for col in df.columns]
+
+
+def axis_choices(profile: list, graph_type: str) -> tuple[list, list]:
+    """Columns the chart type accepts on its X and Y axis; every column when there is no profile"""
+    columns = [col["name"] for col in profile]
+    if graph_type not in AXIS_KINDS:
+        return columns, columns
+    x_kinds, y_kinds = AXIS_KINDS[graph_type]
+    return ([col["name"] for col in profile if col["kind"] in x_kinds],
+            [col["name"] for col in profile if col["kind"] in y_kinds])
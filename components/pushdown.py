@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import Integer, and_, case, cast, column, func, literal_column, select, table
+
+from components.charts import DEFAULT_BINS, binned_histogram
+from components.connections import source_connection
+
+# Chart types whose figure is a single aggregate per category, which the database can compute
+PUSHDOWN_GRAPH_TYPES = ("histogram", "pie")
+
+
+def date_condition(date_column: str, start_date, end_date):
+    """start_date <= date_column <= end_date, where an end date without a time of day includes that whole day
+
+    The same range as dates.range_positions, so live and imported charts filter the same rows.
+    """
+    date = column(date_column)
+    # Bound as 'YYYY-MM-DD HH:MM:SS' text, which MySQL compares as a datetime and SQLite as its stored text
+    start = str(pd.Timestamp(start_date))
+    end = pd.Timestamp(end_date)
+    if end == end.normalize():
+        return and_(date >= start, date < str(end + pd.Timedelta(days=1)))
+    return date.between(start, str(end))
+
+
+def _table(table_name: str):
+    schema = None
+    if "." in table_name:
+        schema, table_name = table_name.split(".", 1)
+    return table(table_name, schema=schema)
+
+
+def aggregate_query(table_name: str, graph_type: str, x_axis: str, y_axis: str | None,
+                    date_column: str | None = None, start_date: str | None = None, end_date: str | None = None):
+    """Parameterized GROUP BY query returning one (x, value) row per category"""
+    source = _table(table_name)
+    x = column(x_axis)
+
+    if graph_type == "histogram":
+        value = func.avg(column(y_axis))
+    elif graph_type == "pie":
+        value = func.sum(column(y_axis)) if y_axis else func.count(literal_column("*"))
+    else:
+        raise ValueError(f"Graph type {graph_type!r} cannot be pushed down")
+
+    query = select(x.label("x"), value.label("value")).select_from(source).group_by(x).order_by(x)
+    if date_column and start_date and end_date:
+        # Bound parameters, the dates never end up in the SQL text
+        query = query.where(date_condition(date_column, start_date, end_date))
+    return query
+
+
+def _histogram_rows(query, x_axis: str, y_axis: str, date_column, start_date, end_date):
+    # Rows charts.aggregate_histogram averages: both axes set, within the date range
+    query = query.where(column(x_axis).is_not(None), column(y_axis).is_not(None))
+    if date_column and start_date and end_date:
+        query = query.where(date_condition(date_column, start_date, end_date))
+    return query
+
+
+def histogram_bounds_query(table_name: str, x_axis: str, y_axis: str, date_column: str | None = None,
+                           start_date: str | None = None, end_date: str | None = None):
+    """Lowest and highest numeric x of a binned histogram"""
+    x = column(x_axis)
+    query = select(func.min(x).label("low"), func.max(x).label("high")).select_from(_table(table_name))
+    return _histogram_rows(query, x_axis, y_axis, date_column, start_date, end_date)
+
+
+def histogram_bins_query(table_name: str, x_axis: str, y_axis: str, bins: int, low: float, width: float,
+                         date_column: str | None = None, start_date: str | None = None, end_date: str | None = None):
+    """Sum and count of y per equal-width x bin, numbered like charts.aggregate_histogram"""
+    # Floored before the cast, which rounds to the nearest integer on MySQL; the highest x closes the last bin
+    index = cast(func.floor((column(x_axis) - low) / width), Integer)
+    bin_index = case((index >= bins, bins - 1), else_=index)
+    query = select(bin_index.label("bin"), func.sum(column(y_axis)).label("sum"), func.count().label("count"))
+    query = query.select_from(_table(table_name))
+    return _histogram_rows(query, x_axis, y_axis, date_column, start_date, end_date).group_by(bin_index)
+
+
+def run_histogram(connection, table_name: str, x_axis: str, y_axis: str, bins: int | None = DEFAULT_BINS,
+                  date_column: str | None = None, start_date: str | None = None,
+                  end_date: str | None = None) -> tuple[pd.DataFrame, float | None]:
+    """Average of y per numeric x bin and the bin width, the same bins as the imported rows get"""
+    low, high = connection.execute(
+        histogram_bounds_query(table_name, x_axis, y_axis, date_column, start_date, end_date)).one()
+    if low is None:
+        return pd.DataFrame({x_axis: [], y_axis: []}), None
+    bins = max(int(bins or DEFAULT_BINS), 1)
+    low, high = float(low), float(high)
+    width = (high - low) / bins if high > low else 1.0
+    rows = pd.read_sql(histogram_bins_query(table_name, x_axis, y_axis, bins, low, width,
+                                            date_column, start_date, end_date), con=connection)
+    sums, counts = np.zeros(bins), np.zeros(bins, dtype="int64")
+    index = rows["bin"].to_numpy(dtype="int64")
+    sums[index] = rows["sum"].to_numpy(dtype="float64")
+    counts[index] = rows["count"].to_numpy(dtype="int64")
+    return binned_histogram(x_axis, y_axis, low, width, sums, counts)
+
+
+def run_aggregate(connection, table_name: str, graph_type: str, x_axis: str, y_axis: str | None,
+                  date_column: str | None = None, start_date: str | None = None, end_date: str | None = None) -> pd.DataFrame:
+    """Run the aggregate query and return it with the sheet's axis names as columns"""
+    query = aggregate_query(table_name, graph_type, x_axis, y_axis, date_column, start_date, end_date)
+    result = pd.read_sql(query, con=connection)
+    return result.rename(columns={"x": x_axis, "value": y_axis or "count"})
+
+
+def _pushdown_source(source: dict, *columns) -> bool:
+    if not source.get("live") or source.get("type") != "mysql":
+        return False
+    # A capped or sampled import holds a subset of the table, which an aggregate over the table would not match
+    if source.get("limit") or source.get("sample"):
+        return False
+    projection = source.get("columns")
+    return not projection or all(name in projection for name in columns if name)
+
+
+def live_aggregate(source: dict, graph_type: str, x_axis: str, y_axis: str | None,
+                   date_column: str | None = None, start_date: str | None = None, end_date: str | None = None) -> pd.DataFrame | None:
+    """Aggregate on the MySQL source of a live dataset, or None when the chart cannot be pushed down"""
+    if graph_type not in PUSHDOWN_GRAPH_TYPES or not _pushdown_source(source, x_axis, y_axis, date_column):
+        return None
+    with source_connection(source["host"], source["port"], source["username"],
+                           source.get("password"), source["database"]) as connection:
+        return run_aggregate(connection, source["table"], graph_type, x_axis, y_axis,
+                             date_column, start_date, end_date)
+
+
+def live_histogram(source: dict, x_axis: str, y_axis: str, bins: int | None = DEFAULT_BINS,
+                   date_column: str | None = None, start_date: str | None = None,
+                   end_date: str | None = None) -> tuple[pd.DataFrame, float | None] | None:
+    """Binned histogram of a numeric x on the MySQL source of a live dataset, or None when it cannot be pushed down"""
+    if not _pushdown_source(source, x_axis, y_axis, date_column):
+        return None
+    with source_connection(source["host"], source["port"], source["username"],
+                           source.get("password"), source["database"]) as connection:
+        return run_histogram(connection, source["table"], x_axis, y_axis, bins, date_column, start_date, end_date)
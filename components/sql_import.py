@@ -0,0 +1,87 @@
+import os
+
+import pandas as pd
+from sqlalchemy import column, func, select, table
+
+from components.datasets import DatasetWriter, append_dataset, load_dataset
+
+CHUNK_ROWS = int(os.environ.get("BI_DB_CHUNK_ROWS", "50000"))
+
+
+def build_select(connection, table_name: str, columns: list | None = None, limit: int | None = None, sample: float | None = None,
+                 after: tuple | None = None):
+    """SELECT for a table with optional column projection, random sampling, row cap and (column, value) watermark
+
+    With a watermark column, the value may be None to read from the start.
+    """
+    schema = None
+    if "." in table_name:
+        schema, table_name = table_name.split(".", 1)
+    source = table(table_name, schema=schema)
+    query = select(*[column(name) for name in columns]) if columns else select(column("*", is_literal=True))
+    query = query.select_from(source)
+
+    if sample is not None and 0 < sample < 1:
+        if connection.dialect.name == "mysql":
+            query = query.where(func.rand() < sample)
+        else:
+            # SQLite returns a signed 64-bit integer from random()
+            query = query.where(func.abs(func.random()) % 1000000 < int(sample * 1000000))
+    if after is not None and after[1] is not None:
+        # Bound parameter, compared on the database so only new rows are sent
+        query = query.where(column(after[0]) > after[1])
+    if limit:
+        if after is not None:
+            # A capped read takes the lowest watermarks first, so the next refresh's strict > skips no row
+            query = query.order_by(column(after[0]))
+        query = query.limit(int(limit))
+    return query
+
+
+def stream_table(connection, table_name: str, columns: list | None = None, limit: int | None = None,
+                 sample: float | None = None, chunk_rows: int = CHUNK_ROWS, source: dict | None = None,
+                 secrets: dict | None = None, progress=None) -> dict:
+    """Read a table through an unbuffered server-side cursor, chunk by chunk, into the dataset store"""
+    watermark = (source or {}).get("watermark")
+    query = build_select(connection, table_name, columns, limit, sample, after=(watermark, None) if watermark else None)
+    streaming = connection.execution_options(stream_results=True, max_row_buffer=chunk_rows)
+
+    writer = DatasetWriter(source, secrets)
+    for chunk in pd.read_sql(query, con=streaming, chunksize=chunk_rows):
+        writer.append(chunk)
+        if progress:
+            progress(writer.rows, writer.nbytes)
+    return writer.finish()
+
+
+def _watermark_value(df: pd.DataFrame, watermark: str):
+    """Highest watermark in the imported rows, as a plain Python value for a bind parameter"""
+    if watermark not in df.columns or df[watermark].isna().all():
+        return None
+    value = df[watermark].max()
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value.item() if hasattr(value, "item") else value
+
+
+def refresh_table(connection, handle: dict, source: dict, chunk_rows: int = CHUNK_ROWS, progress=None) -> dict:
+    """Fetch the rows past the dataset's watermark and append them as its next version
+
+    The last watermark is read from the imported rows, so the refresh costs the rows added, not the table size.
+    """
+    df = load_dataset(handle)
+    if df is None:
+        raise ValueError("The dataset to refresh no longer exists")
+    watermark = source["watermark"]
+    query = build_select(connection, source["table"], source.get("columns"), after=(watermark, _watermark_value(df, watermark)))
+    streaming = connection.execution_options(stream_results=True, max_row_buffer=chunk_rows)
+
+    chunks, rows = [], 0
+    for chunk in pd.read_sql(query, con=streaming, chunksize=chunk_rows):
+        chunks.append(chunk)
+        rows += len(chunk)
+        if progress:
+            progress(rows)
+    if not rows:
+        return handle
+    return append_dataset(handle, pd.concat(chunks, ignore_index=True))
@@ -0,0 +1,109 @@
+import contextlib
+import os
+import re
+import threading
+from urllib.parse import unquote
+
+from flask import jsonify, request
+from werkzeug.utils import secure_filename
+
+from components.locks import HAS_FILE_LOCKS, file_lock
+
+# Uploaded files are streamed here chunk by chunk instead of travelling as base64 through the callbacks
+UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
+
+MAX_CHUNK_BYTES = 16 * 1024 * 1024
+COPY_BUFFER_BYTES = 1024 * 1024
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+_CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+@contextlib.contextmanager
+def _upload_lock(upload_id: str):
+    """Hold an upload for one chunk, against other threads and other server workers"""
+    with _locks_guard:
+        lock = _locks.setdefault(upload_id, threading.Lock())
+    with lock:
+        if not HAS_FILE_LOCKS:
+            yield
+            return
+        # A retried chunk may reach a different worker process than the attempt still being written
+        with file_lock(_part_path(upload_id) + ".lock"):
+            yield
+
+
+def _part_path(upload_id: str) -> str:
+    if not _UPLOAD_ID.match(upload_id or ""):
+        raise ValueError(f"Invalid upload id: {upload_id!r}")
+    return os.path.join(UPLOAD_DIR, f"{upload_id}.part")
+
+
+def uploaded_file_path(upload_id: str, filename: str) -> str:
+    """Location of a completed upload"""
+    if not _UPLOAD_ID.match(upload_id or ""):
+        raise ValueError(f"Invalid upload id: {upload_id!r}")
+    return os.path.join(UPLOAD_DIR, f"{upload_id}-{secure_filename(filename) or 'upload'}")
+
+
+def register_upload_routes(server):
+    """Add the resumable chunked upload endpoint to the Flask server behind Dash"""
+
+    @server.route("/upload/<upload_id>", methods=["GET"])
+    def upload_status(upload_id):
+        # Lets the browser resume an interrupted upload from the last received byte
+        try:
+            path = _part_path(upload_id)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        received = os.path.getsize(path) if os.path.exists(path) else 0
+        return jsonify({"received": received})
+
+    @server.route("/upload/<upload_id>", methods=["PUT"])
+    def upload_chunk(upload_id):
+        try:
+            path = _part_path(upload_id)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        match = _CONTENT_RANGE.match(request.headers.get("Content-Range", ""))
+        if not match:
+            return jsonify({"error": "Missing or malformed Content-Range header"}), 400
+        start, end, total = (int(value) for value in match.groups())
+        length = end - start + 1
+        if length <= 0 or length > MAX_CHUNK_BYTES or end >= total:
+            return jsonify({"error": "Invalid chunk range"}), 400
+
+        with _upload_lock(upload_id):
+            received = os.path.getsize(path) if os.path.exists(path) else 0
+            if start != received:
+                # The client is out of sync, tell it where to continue from
+                return jsonify({"error": "Unexpected offset", "received": received}), 409
+
+            written = 0
+            with open(path, "ab") as f:
+                while written < length:
+                    buffer = request.stream.read(min(COPY_BUFFER_BYTES, length - written))
+                    if not buffer:
+                        break
+                    f.write(buffer)
+                    written += len(buffer)
+
+            if written != length:
+                # Drop the partial chunk so the next attempt starts on a chunk boundary
+                with open(path, "ab") as f:
+                    f.truncate(received)
+                return jsonify({"error": "Incomplete chunk", "received": received}), 400
+
+            received += written
+            if received == total:
+                filename = unquote(request.headers.get("X-Filename", "upload"))
+                os.replace(path, uploaded_file_path(upload_id, filename))
+                if HAS_FILE_LOCKS:
+                    os.remove(path + ".lock")
+                with _locks_guard:
+                    _locks.pop(upload_id, None)
+
+        return jsonify({"received": received, "complete": received == total})
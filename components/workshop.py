@@ -1,30 +1,81 @@
 import dash
-from dash import html, dcc, Input, Output, callback, State, ALL, MATCH, dash_table
+from dash import html, dcc, Input, Output, callback, State, ALL, MATCH, Patch, dash_table
 import dash_bootstrap_components as dbc
+import json
+import logging
+import numpy as np
 import pandas as pd
 import uuid
-import plotly.express as px
+from components.datasets import load_dataset, dataset_columns, dataset_parquet_path, dataset_source, dataset_memory_report, dataset_profile, date_range_positions
+from components.profile import axis_choices
+from components.compaction import format_bytes
+from components.cache import figure_cache, cache_figure, layout_cache
+from components.charts import DEFAULT_BINS, DEFAULT_TOP_N, LOD_GRAPH_TYPES, build_figure, figure_patch, histogram_figure, pie_figure, parse_axis_range
+from components.pushdown import PUSHDOWN_GRAPH_TYPES, live_aggregate, live_histogram
+from components.preview import query_page, column_type
+from components.connections import source_connection
+from components.sql_import import refresh_table
+from components.filters import FILTER_OPERATORS, parse_filter, predicate_bitmap, filter_mask, describe_filter
+from components.engine import engine_figure
+from components.dashboard import SHEET_TIMEOUT, message_figure, start_render
+from components.metrics import dashboard_timeouts
 
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+logger = logging.getLogger(__name__)
+
+PREVIEW_PAGE_SIZE = 10
 
 # Initial tab data
 initial_sheets = [
     {"id": "sheet-1", "label": "sheet1"},
 ]
 
+def create_sheet_tab(tab: dict):
+    return dbc.Tab(
+        label=tab["label"],
+        tab_id=tab["id"],
+        labelClassName="d-flex align-items-center",
+        className="position-relative"
+    )
+
+def create_tabs(sheets_data: list):
+    """Tab bar with the Data Source and Dashboard tabs, one tab per sheet and the + tab
+
+    Built once; adding and closing sheets patch its children instead of rebuilding it.
+    """
+    tab_components = [
+        dbc.Tab(
+            label="Data Source",
+            tab_id="data-source-tab",
+            labelClassName="d-flex align-items-center",
+            className="position-relative"
+        ),
+        dbc.Tab(label="Dashboard", tab_id="dashboard-tab"),
+    ]
+    tab_components.extend(create_sheet_tab(tab) for tab in sheets_data)
+    tab_components.append(
+        dbc.Tab(
+            label="+",
+            tab_id="add-tab-button",
+            label_style={"fontSize": "18px", "fontWeight": "bold"}
+        )
+    )
+    
+    return dbc.Tabs(
+        id="dynamic-tabs",
+        children=tab_components,
+        active_tab="data-source-tab"
+    )
+
 workshop = dbc.Container([
     dcc.Store(id="tabs-store", data=initial_sheets),
     
-    # Store current active tab ID
-    dcc.Store(id="active-tab-store", data=initial_sheets[0]["id"] if initial_sheets else "add-tab-button"),
-    
     # Store chart settings for each sheet
     dcc.Store(id="chart-settings-store", data={}),
     
     html.H1("WorkSpace", className="mb-3"),
     
     # Tab container
-    html.Div(id="tabs-container"),
+    html.Div(create_tabs(initial_sheets), id="tabs-container"),
     
     # Current active tab content display area
     dbc.Card([
@@ -33,7 +84,50 @@ workshop = dbc.Container([
     ], className="mt-3")
 ], fluid=True, id="app-layout-container")
 
-def create_sheet_tools(data, x_axis: str | None, y_axis: str | None, filter: dict | None, graph_type="histogram"):
+def triggered_id():
+    """Id of the input that fired the current callback, None when called outside of one"""
+    try:
+        return dash.ctx.triggered_id
+    except dash.exceptions.MissingCallbackContextException:
+        return None
+
+def create_filter_list(filters: list):
+    """Active column filters of a sheet, each with a remove button"""
+    return [
+        dbc.Badge(
+            [
+                describe_filter(predicate),
+                html.Span(" ×", id={"type": "remove-filter", "index": i}, n_clicks=0, style={"cursor": "pointer"}),
+            ],
+            color="secondary",
+            className="me-1 mb-1",
+        )
+        for i, predicate in enumerate(filters)
+    ]
+
+def axis_options(columns: list, choices: list):
+    """Radio options of every column, those the chart type cannot plot are disabled"""
+    return [{"label": col, "value": col, "disabled": col not in choices} for col in columns]
+
+def create_sheet_tools(columns: list, x_axis: str | None, y_axis: str | None, filter: dict | None, graph_type="histogram",
+                       bins: int = DEFAULT_BINS, top_n: int = DEFAULT_TOP_N, date_columns: list | None = None,
+                       filters: list | None = None, profile: list | None = None, data: dict | None = None):
+    """Chart settings, filters and graph of a sheet
+
+    With the dataset handle, the graph starts with the settings' figure when it is cached.
+    """
+    date_columns = date_columns or []
+    filters = filters or []
+    x_choices, y_choices = axis_choices(profile, graph_type) if profile else (columns, columns)
+    date_column = filter.get('date_column') if filter else None
+    if date_column not in date_columns:
+        date_column = date_columns[0] if date_columns else None
+    start_date = filter.get('start_date') if filter else None
+    end_date = filter.get('end_date') if filter else None
+    figure_key = figure = None
+    if data:
+        figure_key = figure_cache_key(data, graph_type, x_axis, y_axis, date_column, start_date, end_date, bins, top_n, filters)
+        figure = figure_cache.get(figure_key)
     sheet_tools = dbc.Container(
         [
             dbc.Row(
@@ -55,21 +149,21 @@ def create_sheet_tools(data, x_axis: str | None, y_axis: str | None, filter: dic
                             html.Label("X-Axis"),
                             dbc.RadioItems(
                                 id="x-axis-radio",
-                                options={
-                                    df_col: df_col for df_col in pd.DataFrame.from_dict(data).columns
-                                },
+                                options=axis_options(columns, x_choices),
                                 value=x_axis,
                                 inline=False,
                             ),
                             html.Label("Y-Axis"),
                             dbc.RadioItems(
                                 id="y-axis-radio",
-                                options={
-                                    df_col: df_col for df_col in pd.DataFrame.from_dict(data).columns
-                                },
+                                options=axis_options(columns, y_choices),
                                 value=y_axis,
                                 inline=False,
                             ),
+                            html.Label("Histogram Bins"),
+                            dcc.Input(id="bins-input", type="number", min=1, max=500, step=1, value=bins, debounce=True),
+                            html.Label("Pie Slices"),
+                            dcc.Input(id="top-n-input", type="number", min=1, max=100, step=1, value=top_n, debounce=True),
                             
                         ],
                         width=2,
@@ -81,6 +175,14 @@ def create_sheet_tools(data, x_axis: str | None, y_axis: str | None, filter: dic
                                     dbc.Row(
                                         [
                                             dbc.Label("Date Filter"),
+                                            dcc.Dropdown(
+                                                id='date-column-dropdown',
+                                                options=date_columns,
+                                                value=date_column,
+                                                placeholder='No date column',
+                                                clearable=False,
+                                                className='mb-2'
+                                            ),
                                             dcc.DatePickerRange(
                                                 id='date-picker-range',
                                                 start_date_placeholder_text='Start Date',
@@ -88,10 +190,33 @@ def create_sheet_tools(data, x_axis: str | None, y_axis: str | None, filter: dic
                                                 display_format='YYYY-MM-DD',
                                                 minimum_nights=0,
                                                 show_outside_days=True,
-                                                start_date=filter.get('start_date') if filter else None,
-                                                end_date=filter.get('end_date') if filter else None
+                                                start_date=start_date,
+                                                end_date=end_date
                                             )
                                         ]
+                                    ),
+                                    dbc.Row(
+                                        [
+                                            dbc.Label("Column Filters", className="mt-3"),
+                                            dcc.Dropdown(
+                                                id='filter-column-dropdown',
+                                                options=columns,
+                                                placeholder='Column',
+                                                className='mb-2'
+                                            ),
+                                            dcc.Dropdown(
+                                                id='filter-op-dropdown',
+                                                options=[{"label": label, "value": op} for op, label in FILTER_OPERATORS.items()],
+                                                value='eq',
+                                                clearable=False,
+                                                className='mb-2'
+                                            ),
+                                            dcc.Input(id='filter-value-input', type='text', placeholder='Value, or a, b for lists and ranges'),
+                                            dbc.Button("Add Filter", id='add-filter-button', size='sm', className='mt-2'),
+                                            html.Div(id='filter-error', className='text-danger small'),
+                                            html.Div(create_filter_list(filters), id='filter-list', className='mt-2'),
+                                            dcc.Store(id='sheet-filters-store', data=filters),
+                                        ]
                                     )
                                 ]
                             )
@@ -100,7 +225,9 @@ def create_sheet_tools(data, x_axis: str | None, y_axis: str | None, filter: dic
                     ),
                     dbc.Col(
                         [
-                            dcc.Graph(figure={}, id='controls-and-graph')
+                            dcc.Graph(figure=figure or {}, id='controls-and-graph'),
+                            # Figure cache key of what the graph shows, so the next render can be sent as a patch
+                            dcc.Store(id="figure-key-store", data=list(figure_key) if figure is not None else None),
                         ],
                         width=8,
                     )
@@ -110,127 +237,273 @@ def create_sheet_tools(data, x_axis: str | None, y_axis: str | None, filter: dic
     )
     return sheet_tools
 
+def figure_cache_key(data: dict, graph_type, x_axis, y_axis, date_column, start_date, end_date, bins, top_n,
+                     filters: list | None, x_range: list | None = None, y_range: list | None = None) -> tuple:
+    """Figure cache key of a dataset version and a sheet's chart settings"""
+    return (data["dataset_id"], data["version"], graph_type, x_axis, y_axis, date_column, start_date, end_date,
+            bins, top_n, tuple(x_range or ()), tuple(y_range or ()), json.dumps(filters or [], sort_keys=True))
+
+def valid_axes(choices: list, other_choices: list, x_axis, y_axis):
+    """Keep the selected axes that fit the chart type, replace the others with the first that does"""
+    if x_axis not in choices:
+        x_axis = choices[0] if choices else None
+    if y_axis not in other_choices:
+        y_axis = next((col for col in other_choices if col != x_axis), other_choices[0] if other_choices else None)
+    return x_axis, y_axis
+
+@callback(
+    Output("x-axis-radio", "options"),
+    Output("y-axis-radio", "options"),
+    Output("x-axis-radio", "value"),
+    Output("y-axis-radio", "value"),
+    Input("graph-type-radio", "value"),
+    State("x-axis-radio", "value"),
+    State("y-axis-radio", "value"),
+    State("uploaded-data-store", "data"),
+    prevent_initial_call=True
+)
+def update_axis_choices(graph_type, x_axis, y_axis, data):
+    """Offer only the columns the chart type can plot, from the dataset's column profile"""
+    profile = dataset_profile(data)
+    if not profile:
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    columns = [col["name"] for col in profile]
+    x_choices, y_choices = axis_choices(profile, graph_type)
+    new_x, new_y = valid_axes(x_choices, y_choices, x_axis, y_axis)
+    return (axis_options(columns, x_choices), axis_options(columns, y_choices),
+            new_x if new_x != x_axis else dash.no_update, new_y if new_y != y_axis else dash.no_update)
+
 @callback(
     Output("chart-settings-store", "data"),
     Input("x-axis-radio", "value"),
     Input("y-axis-radio", "value"),
-    State("chart-settings-store", "data"),
-    State("active-tab-store", "data"),
+    State("dynamic-tabs", "active_tab"),
 )
-def update_axis_options(x_axis, y_axis, chart_settings, active_tab):
-    if not chart_settings:
-        chart_settings = {}
-    
-    try:
-        # Update chart settings for the current active tab
-        if active_tab not in chart_settings:
-            chart_settings[active_tab] = {}
-        
-        chart_settings[active_tab]["x_axis"] = x_axis
-        chart_settings[active_tab]["y_axis"] = y_axis
-        
-        print(f"Updated settings for tab {active_tab}: {chart_settings[active_tab]}")
-        return chart_settings
-        
-    except Exception as e:
-        print(f"Error updating axis options: {e}")
-        return chart_settings
+def update_axis_options(x_axis, y_axis, active_tab):
+    # Only the active sheet's axes are sent back, merged into the store in the browser
+    settings = Patch()
+    settings[active_tab].update({"x_axis": x_axis, "y_axis": y_axis})
+    logger.debug("Updated axes for tab %s: %s, %s", active_tab, x_axis, y_axis)
+    return settings
         
 @callback(
     Output("chart-settings-store", "data", allow_duplicate=True),
     Output("controls-and-graph", "figure"),
+    Output("figure-key-store", "data"),
     Input("graph-type-radio", "value"),
     Input("x-axis-radio", "value"),
     Input("y-axis-radio", "value"),
     Input("date-picker-range", "start_date"),
     Input("date-picker-range", "end_date"),
+    Input("date-column-dropdown", "value"),
+    Input("bins-input", "value"),
+    Input("top-n-input", "value"),
+    Input("controls-and-graph", "relayoutData"),
+    Input("sheet-filters-store", "data"),
     State("uploaded-data-store", "data"),
-    State("chart-settings-store", "data"),
     State("dynamic-tabs", "active_tab"),
+    State("figure-key-store", "data"),
     prevent_initial_call=True
 )
-def update_graph(graph_type, x_axis, y_axis, start_date, end_date, data, chart_settings, active_tab):
+def update_graph(graph_type, x_axis, y_axis, start_date, end_date, date_column, bins, top_n, relayout_data, filters,
+                 data, active_tab, shown_key=None):
     if not data:
         return dash.no_update
     
-    # Update chart settings for the current sheet
-    updated_settings = chart_settings.copy()
+    # Zooming re-queries scatter and line charts at a higher level of detail
+    if triggered_id() == "controls-and-graph":
+        zoom_changed = relayout_data and any(key.startswith(("xaxis.", "yaxis.")) for key in relayout_data)
+        if graph_type not in LOD_GRAPH_TYPES or not zoom_changed:
+            return dash.no_update
+        x_range = parse_axis_range(relayout_data, "xaxis")
+        y_range = parse_axis_range(relayout_data, "yaxis")
+    else:
+        # relayoutData outlives the chart it was zoomed on, other changes keep the shown figure's zoom instead
+        x_range, y_range = shown_zoom(shown_key, graph_type, x_axis, y_axis)
+    
+    # Axes the chart type cannot plot are being replaced by update_axis_choices, skip the failing render
+    profile = dataset_profile(data)
+    if profile:
+        x_choices, y_choices = axis_choices(profile, graph_type)
+        if x_axis not in x_choices or y_axis not in y_choices:
+            return dash.no_update
+    
+    # Repeat renders of unchanged settings are served from the figure cache
+    cache_key = figure_cache_key(data, graph_type, x_axis, y_axis, date_column, start_date, end_date, bins, top_n,
+                                 filters, x_range, y_range)
+    if shown_key and stored_figure_key(shown_key) == cache_key:
+        # A cached sheet layout was mounted with this very figure, and its settings are already stored
+        return dash.no_update
+    
+    # Update chart settings for the current sheet only
+    updated_settings = Patch()
     updated_settings[active_tab] = {
         "graph_type": graph_type,
         "x_axis": x_axis,
         "y_axis": y_axis,
-        "filter": {"start_date": start_date, "end_date": end_date}
+        "filter": {"start_date": start_date, "end_date": end_date, "date_column": date_column},
+        "bins": bins,
+        "top_n": top_n,
+        "filters": filters or [],
     }
     
-    df = pd.DataFrame.from_dict(data)
+    fig, figure_key = sheet_figure(data, graph_type, x_axis, y_axis, date_column, start_date, end_date, bins, top_n,
+                                   filters, x_range, y_range)
+    if fig is None:
+        return dash.no_update
+    if figure_key is None:
+        return updated_settings, fig, None
+    return updated_settings, send_figure(shown_key, fig), list(figure_key)
+
+def sheet_figure(data, graph_type, x_axis, y_axis, date_column, start_date, end_date, bins, top_n, filters,
+                 x_range=None, y_range=None):
+    """Figure of a sheet's chart settings and its figure cache key
+
+    Live database figures are not cached and come without a key; settings the dataset cannot chart give no figure.
+    """
+    cache_key = figure_cache_key(data, graph_type, x_axis, y_axis, date_column, start_date, end_date, bins, top_n,
+                                 filters, x_range, y_range)
+    fig = figure_cache.get(cache_key)
+    if fig is not None:
+        return fig, cache_key
     
-    # Filter data if date filter is applied
-    if start_date and end_date:
-        # Assuming there is a column named 'date' in the data
-        # If the actual date column name is different, it needs to be replaced
-        if 'date' in df.columns:
-            df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
-        else:
-            print("Warning: 'date' column not found in data. Date filtering will not be applied.")
+    # Live MySQL datasets aggregate histograms and pies in the database, column filters are applied locally
+    if graph_type in PUSHDOWN_GRAPH_TYPES and not filters:
+        fig = create_live_figure(data, graph_type, x_axis, y_axis, date_column, start_date, end_date, bins, top_n)
+        if fig is not None:
+            return fig, None
     
-    if x_axis not in df.columns or (graph_type != "pie" and y_axis not in df.columns):
-        return dash.no_update
+    # Large datasets are charted by the embedded engine from their Parquet copy, without loading their rows
+    parquet_path = dataset_parquet_path(data)
+    if parquet_path and x_axis in dataset_columns(data) and (graph_type == "pie" or y_axis in dataset_columns(data)):
+        try:
+            fig = engine_figure(parquet_path, data["schema"], graph_type, x_axis, y_axis, bins, top_n,
+                                date_column if date_column in data.get("date_columns", []) else None,
+                                start_date, end_date, filters, x_range, y_range)
+            return cache_figure(cache_key, fig), cache_key
+        except Exception as e:
+            logger.warning("Chart engine failed, falling back to the DataFrame: %s", e)
     
-    if graph_type == "histogram":
-        fig = px.histogram(df, x=x_axis, y=y_axis, histfunc='avg')
-    elif graph_type == "pie":
-        fig = px.pie(df, names=x_axis, values=y_axis)
-    elif graph_type == "scatter":
-        fig = px.scatter(df, x=x_axis, y=y_axis)
-    elif graph_type == "line":
-        fig = px.line(df, x=x_axis, y=y_axis)
-    else:
-        fig = {}
+    df = load_dataset(data)
+    if df is None:
+        return None, None
+    
+    # Filter data if date filter is applied, by binary search in the column's sorted date index
+    positions = None
+    if start_date and end_date and date_column:
+        positions = date_range_positions(data, date_column, start_date, end_date)
+        if positions is None:
+            logger.warning("'%s' has no date index. Date filtering will not be applied.", date_column)
+    
+    # Column filters are ANDed as bitmaps over the whole dataset, then intersected with the date range
+    mask = filter_mask(df, (data["dataset_id"], data["version"]), filters)
+    if mask is not None:
+        positions = np.flatnonzero(mask) if positions is None else positions[mask[positions]]
+    if positions is not None:
+        df = df.take(positions)
+    
+    if x_axis not in df.columns or (graph_type != "pie" and y_axis not in df.columns):
+        return None, None
     
-    return updated_settings, fig
+    fig = build_figure(df, graph_type, x_axis, y_axis, bins, top_n, x_range, y_range)
+    return cache_figure(cache_key, fig), cache_key
+
+def stored_figure_key(stored: list) -> tuple:
+    """Figure cache key kept in figure-key-store; it went through JSON, so its axis ranges are lists again"""
+    return tuple(tuple(part) if isinstance(part, list) else part for part in stored)
+
+def shown_zoom(shown_key: list | None, graph_type, x_axis, y_axis) -> tuple:
+    """Axis ranges of the figure the graph shows, when it is the same chart, which uirevision keeps zoomed"""
+    if not shown_key or graph_type not in LOD_GRAPH_TYPES:
+        return None, None
+    shown = stored_figure_key(shown_key)
+    if shown[2:5] != (graph_type, x_axis, y_axis):
+        return None, None
+    return list(shown[10]) or None, list(shown[11]) or None
+
+def send_figure(shown_key: list | None, fig: dict):
+    """Patch the figure the graph shows into fig, when that figure is still cached"""
+    if not shown_key:
+        return fig
+    return figure_patch(figure_cache.get(stored_figure_key(shown_key)), fig)
 
 @callback(
-    Output("tabs-container", "children"),
-    Input("tabs-store", "data"),
-    Input("active-tab-store", "data")
+    Output("sheet-filters-store", "data"),
+    Output("filter-list", "children"),
+    Output("filter-error", "children"),
+    Input("add-filter-button", "n_clicks"),
+    Input({"type": "remove-filter", "index": ALL}, "n_clicks"),
+    State("filter-column-dropdown", "value"),
+    State("filter-op-dropdown", "value"),
+    State("filter-value-input", "value"),
+    State("sheet-filters-store", "data"),
+    State("uploaded-data-store", "data"),
+    prevent_initial_call=True
 )
-def initialize_workshop(sheets_data, active_tab_id):
+def update_sheet_filters(add_clicks, remove_clicks, column, op, value, filters, data):
+    """Add a predicate from the filter form, or remove one from the sheet's active filters"""
+    filters = list(filters or [])
+    trigger = triggered_id()
     
-    # Create regular tabs
-    tab_components = []
-    tab_components.append(
-        dbc.Tab(
-            label="Data Source",
-            tab_id="data-source-tab",
-            labelClassName="d-flex align-items-center",
-            className="position-relative"
-        )
-    )
-
-    for tab in sheets_data:
-        tab_components.append(
-            dbc.Tab(
-                label=tab["label"],
-                tab_id=tab["id"],
-                labelClassName="d-flex align-items-center",
-                className="position-relative"
-            )
-        )
+    if isinstance(trigger, dict) and trigger.get("type") == "remove-filter":
+        index = trigger["index"]
+        # Rendering the list fires this callback too, only real clicks remove a filter
+        if index >= len(filters) or not remove_clicks[index]:
+            return dash.no_update, dash.no_update, dash.no_update
+        filters.pop(index)
+        return filters, create_filter_list(filters), ""
     
-    tab_components.append(
-        dbc.Tab(
-            label="+",
-            tab_id="add-tab-button",
-            label_style={"fontSize": "18px", "fontWeight": "bold"}
-        )
-    )
+    if not add_clicks:
+        return dash.no_update, dash.no_update, dash.no_update
+    df = load_dataset(data)
+    if df is None or column not in df.columns:
+        return dash.no_update, dash.no_update, "Select a column to filter on."
+    if value is None or str(value).strip() == "":
+        return dash.no_update, dash.no_update, "Enter a filter value."
     
-    return dbc.Tabs(
-        id="dynamic-tabs",
-        children=tab_components,
-        active_tab="data-source-tab"
-    )
+    try:
+        predicate = parse_filter(df[column], op, value)
+        # Evaluated once here, so a predicate the column cannot compare is reported instead of failing the chart
+        predicate_bitmap(df, (data["dataset_id"], data["version"]), predicate)
+    except (ValueError, TypeError) as e:
+        return dash.no_update, dash.no_update, f"Invalid filter value for '{column}': {e}"
+    filters.append(predicate)
+    return filters, create_filter_list(filters), ""
 
+def create_live_figure(data, graph_type, x_axis, y_axis, date_column, start_date, end_date, bins=DEFAULT_BINS,
+                       top_n=DEFAULT_TOP_N):
+    """Figure from an aggregate query on the dataset's MySQL source, or None to build it locally"""
+    source = dataset_source(data, with_secrets=True)
+    if not source.get("live"):
+        return None
+    
+    columns = dataset_columns(data)
+    if x_axis not in columns or (graph_type != "pie" and y_axis not in columns):
+        return None
+    if not (start_date and end_date) or date_column not in columns:
+        date_column = None
+    
+    # Histograms bin numeric x like the imported rows do; dates are binned locally
+    x_dtype = next(pd.api.types.pandas_dtype(col["dtype"]) for col in data["schema"] if col["name"] == x_axis)
+    binned = graph_type == "histogram" and pd.api.types.is_numeric_dtype(x_dtype) \
+        and not pd.api.types.is_bool_dtype(x_dtype)
+    if graph_type == "histogram" and pd.api.types.is_datetime64_any_dtype(x_dtype):
+        return None
+    
+    try:
+        if binned:
+            agg, width = live_histogram(source, x_axis, y_axis, bins, date_column, start_date, end_date) or (None, None)
+        else:
+            agg, width = live_aggregate(source, graph_type, x_axis, y_axis, date_column, start_date, end_date), None
+    except Exception as e:
+        logger.warning("Live query failed, falling back to the imported rows: %s", e)
+        return None
+    if agg is None:
+        return None
+    
+    if graph_type == "histogram":
+        return histogram_figure(agg, x_axis, y_axis, width)
+    return pie_figure(agg, x_axis, y_axis, top_n or DEFAULT_TOP_N)
 
     # Handle tab content display
 @callback(
@@ -245,6 +518,8 @@ def update_tab_content(active_tab, sheets_data, uploaded_data, chart_settings):
     # If it's the Data Source tab, display data source content
     if active_tab == "data-source-tab":
         return create_data_source(uploaded_data)
+    if active_tab == "dashboard-tab":
+        return create_dashboard(sheets_data, uploaded_data, chart_settings)
     
     # Find the content of the current active tab
     for tab in sheets_data:
@@ -257,26 +532,107 @@ def update_tab_content(active_tab, sheets_data, uploaded_data, chart_settings):
             if not uploaded_data:
                 return html.Div("Please upload data first to use this tab.")
             
-            df = pd.DataFrame.from_dict(uploaded_data)
-            columns = df.columns.tolist()
+            # Revisited sheets whose settings did not change are served whole, chart included;
+            # the layout does not depend on the sheet id, so sheets with the same settings share it
+            layout_key = (uploaded_data["dataset_id"], uploaded_data["version"],
+                          json.dumps(current_tab_settings, sort_keys=True))
+            sheet_tools = layout_cache.get(layout_key)
+            if sheet_tools is not None:
+                return sheet_tools
             
-            # Get current settings, or use defaults if not available
-            x_axis = current_tab_settings.get("x_axis", columns[0] if columns else None)
-            y_axis = current_tab_settings.get("y_axis", columns[1] if len(columns) > 1 else None)
-            filter = current_tab_settings.get("filter")
-            filter_value = current_tab_settings.get("filter_value")
-            graph_type = current_tab_settings.get("graph_type", "histogram")
+            columns = dataset_columns(uploaded_data)
+            profile = dataset_profile(uploaded_data)
+            settings = resolve_sheet_settings(uploaded_data, current_tab_settings, columns, profile)
+            filter = {key: settings[key] for key in ("date_column", "start_date", "end_date")}
             
-            # Ensure x_axis and y_axis are valid column names
-            if x_axis not in columns:
-                x_axis = columns[0] if columns else None
-            if y_axis not in columns and len(columns) > 1:
-                y_axis = columns[1]
-            elif y_axis not in columns and len(columns) == 1:
-                y_axis = None
-            
-            return create_sheet_tools(uploaded_data, x_axis, y_axis, filter, graph_type)
+            sheet_tools = create_sheet_tools(columns, settings["x_axis"], settings["y_axis"], filter,
+                                             settings["graph_type"], settings["bins"], settings["top_n"],
+                                             uploaded_data.get("date_columns", []), settings["filters"], profile,
+                                             uploaded_data)
+            # Only layouts with their chart are kept, the others still need update_graph to draw it
+            if sheet_tools["controls-and-graph"].figure:
+                layout_cache.put(layout_key, sheet_tools)
+            return sheet_tools
+    
+
+def resolve_sheet_settings(data: dict, settings: dict, columns: list, profile: list | None) -> dict:
+    """A sheet's chart settings with defaults filled in, and axes and date column the dataset can chart
+
+    Keys are the parameters of sheet_figure, so the sheet and the dashboard render the same figure.
+    """
+    graph_type = settings.get("graph_type", "histogram")
+    x_axis = settings.get("x_axis", columns[0] if columns else None)
+    y_axis = settings.get("y_axis", columns[1] if len(columns) > 1 else None)
+    
+    # Ensure x_axis and y_axis are columns the chart type can plot
+    x_choices, y_choices = axis_choices(profile, graph_type) if profile else (columns, columns)
+    x_axis, y_axis = valid_axes(x_choices, y_choices, x_axis, y_axis)
+    
+    filter = settings.get("filter") or {}
+    date_columns = data.get("date_columns", [])
+    date_column = filter.get("date_column")
+    if date_column not in date_columns:
+        date_column = date_columns[0] if date_columns else None
+    return {
+        "graph_type": graph_type,
+        "x_axis": x_axis,
+        "y_axis": y_axis,
+        "date_column": date_column,
+        "start_date": filter.get("start_date"),
+        "end_date": filter.get("end_date"),
+        "bins": settings.get("bins") or DEFAULT_BINS,
+        "top_n": settings.get("top_n") or DEFAULT_TOP_N,
+        "filters": settings.get("filters") or [],
+    }
+
+def create_dashboard(sheets_data: list, data: dict | None, chart_settings: dict):
+    """Every sheet's chart at once
+
+    Charts that are not cached are all started on the render pool here, and each card's own
+    render_dashboard_chart callback waits for its chart, so they show up as they finish.
+    """
+    if not data:
+        return html.Div("Please upload data first to use this tab.")
+    
+    columns = dataset_columns(data)
+    profile = dataset_profile(data)
+    cards = []
+    for tab in sheets_data:
+        settings = resolve_sheet_settings(data, chart_settings.get(tab["id"], {}), columns, profile)
+        figure = figure_cache.get(figure_cache_key(data, **settings))
+        body = [dcc.Graph(id={"type": "dashboard-graph", "sheet": tab["id"]}, figure=figure or {},
+                          config={"displayModeBar": False}, style={"height": "360px"})]
+        if figure is None:
+            start_render(figure_cache_key(data, **settings), sheet_figure, data, **settings)
+            body.append(dcc.Store(id={"type": "dashboard-sheet", "sheet": tab["id"]}, data=settings))
+        cards.append(dbc.Col(dbc.Card([
+            dbc.CardHeader(f"{tab['label']}: {settings['graph_type']} of {settings['x_axis']}"
+                           + (f" and {settings['y_axis']}" if settings["graph_type"] != "pie" else "")),
+            dbc.CardBody(dcc.Loading(body)),
+        ]), width=12, xl=6, className="mb-3"))
+    return dbc.Row(cards)
+
+@callback(
+    Output({"type": "dashboard-graph", "sheet": MATCH}, "figure"),
+    Input({"type": "dashboard-sheet", "sheet": MATCH}, "data"),
+    State("uploaded-data-store", "data"),
+)
+def render_dashboard_chart(settings, data):
+    """Wait for one dashboard chart, every chart is a request of its own"""
+    if not settings or not data:
+        return dash.no_update
     
+    # Joins the computation create_dashboard started, or starts it on a worker that did not serve the layout
+    future = start_render(figure_cache_key(data, **settings), sheet_figure, data, **settings)
+    try:
+        fig, _ = future.result(timeout=SHEET_TIMEOUT)
+    except TimeoutError:
+        dashboard_timeouts.inc()
+        return message_figure(f"Not ready after {SHEET_TIMEOUT:g}s, open the dashboard again to show it")
+    except Exception as e:
+        logger.warning("Dashboard chart failed: %s", e)
+        return message_figure("This chart could not be rendered")
+    return fig if fig is not None else message_figure("Nothing to chart with these settings")
 
 @callback(
     Output("data-source-tab", "children"),  # This callback is actually not needed as data is displayed in tab-content-area
@@ -285,49 +641,135 @@ def update_tab_content(active_tab, sheets_data, uploaded_data, chart_settings):
 )
 def create_data_source(data):
     """Create data source table display component"""
-    if not data:
-        print("No data available for display.")
+    df = load_dataset(data)
+    if df is None:
+        logger.debug("No data available for display.")
         return html.Div("No Uploaded Data")
     
     try:
-        # Directly use the uploaded data, ensuring type correctness
-        formatted_data = []
-        for row in data:
-            formatted_row = {}
-            for key, value in row.items():
-                # Ensure key is a string
-                str_key = str(key)
-                # Ensure value is a basic type
-                if isinstance(value, (int, float, str, bool)):
-                    formatted_row[str_key] = value
-                else:
-                    formatted_row[str_key] = str(value)
-            formatted_data.append(formatted_row)
-        
-        # Get all column names
-        columns = list(formatted_data[0].keys()) if formatted_data else []
+        # Only the first page is sent here, further pages are sliced on the server
+        key = (data["dataset_id"], data["version"])
+        page_data, page_count = query_page(df, key, 0, PREVIEW_PAGE_SIZE, [], "")
         
         return html.Div([
             html.H4("Uploaded Data Preview"),
+            create_refresh_controls(data),
             dash_table.DataTable(
-                data=formatted_data,
-                columns=[{'name': col, 'id': col} for col in columns],
-                page_size=10,
+                id="data-source-table",
+                data=page_data,
+                columns=[{'name': col, 'id': col, 'type': column_type(dtype)} for col, dtype in df.dtypes.items()],
+                page_current=0,
+                page_size=PREVIEW_PAGE_SIZE,
+                page_count=page_count,
+                page_action='custom',
+                sort_action='custom',
+                sort_mode='multi',
+                sort_by=[],
+                filter_action='custom',
+                filter_query='',
                 style_table={'overflowX': 'auto'},
                 style_cell={'textAlign': 'left', 'padding': '5px'},
                 style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'}
-            )
+            ),
+            create_memory_report(dataset_memory_report(data))
         ])
     except Exception as e:
         return html.Div([
             html.H4("Data Error"),
             html.P(f"Failed to display data: {str(e)}")
         ])
+
+def create_refresh_controls(data):
+    """Refresh button of datasets imported from MySQL with a watermark column"""
+    source = dataset_source(data)
+    if source.get("type") != "mysql" or not source.get("watermark"):
+        return html.Div()
+    return html.Div([
+        html.Span(f'{data.get("rows", 0):,} rows from {source["table"]}, new rows are found by {source["watermark"]}. ',
+                  className="me-2"),
+        dbc.Button("Refresh", id="refresh-data-button", size="sm", color="secondary"),
+        html.Span(id="refresh-status", className="ms-2 text-muted"),
+    ], className="mb-2")
+
+@callback(
+    Output("uploaded-data-store", "data", allow_duplicate=True),
+    Output("tab-content-area", "children", allow_duplicate=True),
+    Input("refresh-data-button", "n_clicks"),
+    State("uploaded-data-store", "data"),
+    background=True,
+    running=[(Output("refresh-data-button", "disabled"), True, False)],
+    prevent_initial_call=True
+)
+def refresh_data_source(n_clicks, data):
+    """Append the rows added to the source table since the import as a new dataset version"""
+    if not n_clicks:
+        return dash.no_update, dash.no_update
+    source = dataset_source(data, with_secrets=True)
+    try:
+        with source_connection(source["host"], source["port"], source["username"],
+                               source.get("password"), source["database"]) as connection:
+            handle = refresh_table(connection, data, source)
+    except Exception:
+        logger.exception("Refresh of %s failed", data.get("dataset_id") if isinstance(data, dict) else None)
+        return dash.no_update, dash.no_update
+    if handle["version"] == data["version"]:
+        return dash.no_update, dash.no_update
+    return handle, create_data_source(handle)
+
+def create_memory_report(report: list):
+    """Per-column memory of the dataset as parsed and after import-time compaction"""
+    if not report:
+        return html.Div()
+    before = sum(col["bytes_before"] for col in report)
+    after = sum(col["bytes_after"] for col in report)
+    
+    return html.Div([
+        html.H5("Memory Usage", className="mt-4"),
+        html.P(f"{format_bytes(before)} as parsed, {format_bytes(after)} after compaction "
+               f"({before / max(after, 1):.1f}x smaller)"),
+        dbc.Table(
+            [
+                html.Thead(html.Tr([html.Th(name) for name in ("Column", "Type", "Before", "After")])),
+                html.Tbody([
+                    html.Tr([
+                        html.Td(col["column"]),
+                        html.Td(col["dtype_after"] if col["dtype_after"] == col["dtype_before"]
+                                else f'{col["dtype_before"]} → {col["dtype_after"]}'),
+                        html.Td(format_bytes(col["bytes_before"])),
+                        html.Td(format_bytes(col["bytes_after"])),
+                    ])
+                    for col in report
+                ]),
+            ],
+            size="sm",
+            striped=True,
+        )
+    ])
+
+@callback(
+    Output("data-source-table", "data"),
+    Output("data-source-table", "page_count"),
+    Input("data-source-table", "page_current"),
+    Input("data-source-table", "page_size"),
+    Input("data-source-table", "sort_by"),
+    Input("data-source-table", "filter_query"),
+    State("uploaded-data-store", "data"),
+    prevent_initial_call=True
+)
+def update_data_source_page(page_current, page_size, sort_by, filter_query, data):
+    """Serve the visible page of the Data Source preview"""
+    df = load_dataset(data)
+    if df is None:
+        return dash.no_update, dash.no_update
+    
+    key = (data["dataset_id"], data["version"])
+    return query_page(df, key, page_current or 0, page_size or PREVIEW_PAGE_SIZE, sort_by, filter_query)
     
 # Handle adding new tabs
 @callback(
     Output("tabs-store", "data"),
-    Output("active-tab-store", "data"),
+    Output("dynamic-tabs", "children"),
+    Output("dynamic-tabs", "active_tab"),
     Input("dynamic-tabs", "active_tab"),
     State("tabs-store", "data"),
     prevent_initial_call=True
@@ -355,16 +797,19 @@ def handle_add_tab(active_tab, sheets_data):
         
         # Insert the new tab before the + tab
         updated_tabs = sheets_data + [new_tab]
+        tabs = Patch()
+        tabs.insert(-1, create_sheet_tab(new_tab))
         
         # Activate the newly added tab
-        return updated_tabs, new_tab_id
+        return updated_tabs, tabs, new_tab_id
     
-    return dash.no_update, dash.no_update
+    return dash.no_update, dash.no_update, dash.no_update
 
 # Handle closing tabs
 @callback(
     Output("tabs-store", "data", allow_duplicate=True),
-    Output("active-tab-store", "data", allow_duplicate=True),
+    Output("dynamic-tabs", "children", allow_duplicate=True),
+    Output("dynamic-tabs", "active_tab", allow_duplicate=True),
     Input({"type": "close-tab", "tab_id": ALL}, "n_clicks"),
     State("tabs-store", "data"),
     State("dynamic-tabs", "active_tab"),
@@ -373,7 +818,7 @@ def handle_add_tab(active_tab, sheets_data):
 def handle_close_tab(close_clicks, sheets_data, active_tab):
     ctx = dash.callback_context
     if not ctx.triggered:
-        return dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update, dash.no_update
     
     # Get the ID of the tab whose close button was clicked
     triggered_id = ctx.triggered[0]["prop_id"]
@@ -383,10 +828,15 @@ def handle_close_tab(close_clicks, sheets_data, active_tab):
         
         # Check if the tab to be closed is a fixed tab (Data Source or sheet1)
         if tab_id_to_close in ["tab-1", "tab-2"]:
-            return dash.no_update, dash.no_update
+            return dash.no_update, dash.no_update, dash.no_update
         
-        # Filter out the tab to be closed
-        updated_tabs = [tab for tab in sheets_data if tab["id"] != tab_id_to_close]
+        # Filter out the tab to be closed, and remove it from the tab bar after the Data Source and Dashboard tabs
+        position = next((i for i, tab in enumerate(sheets_data) if tab["id"] == tab_id_to_close), None)
+        if position is None:
+            return dash.no_update, dash.no_update, dash.no_update
+        updated_tabs = sheets_data[:position] + sheets_data[position + 1:]
+        tabs = Patch()
+        del tabs[position + 2]
         
         # If the closed tab was the active one, activate the first tab or the + tab
         new_active_tab = active_tab
@@ -396,25 +846,6 @@ def handle_close_tab(close_clicks, sheets_data, active_tab):
             else:
                 new_active_tab = "add-tab-button"
         
-        return updated_tabs, new_active_tab
+        return updated_tabs, tabs, new_active_tab if new_active_tab != active_tab else dash.no_update
     
-    return dash.no_update, dash.no_update
-
-# Example callback: Embed the entire app layout as a child of another container
-@callback(
-    Output("outer-container", "children"),
-    Input("trigger-button", "n_clicks")
-)
-def embed_app_in_outer_container(n_clicks):
-    if n_clicks:
-        # Return the app layout container
-        return app.layout
-    else:
-        # In initial state or when not clicked, show a prompt message
-        return html.Div([
-            dbc.Button("Load App", id="trigger-button", color="primary"),
-            html.Div(id="app-container")
-        ])
-
-if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    return dash.no_update, dash.no_update, dash.no_update
@@ -0,0 +1,25 @@
+# Production server: gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+wsgi_app = "app:server"
+bind = os.environ.get("BI_BIND", "0.0.0.0:8050")
+
+# Pre-forked workers, each with a few threads; callbacks are mostly pandas and numpy work that releases the GIL
+workers = int(os.environ.get("BI_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("BI_THREADS", "4"))
+timeout = int(os.environ.get("BI_TIMEOUT", "120"))
+graceful_timeout = 30
+
+# Restart workers now and then so memory fragmented by large frames is given back
+max_requests = int(os.environ.get("BI_MAX_REQUESTS", "1000"))
+max_requests_jitter = max_requests // 10
+
+# The app is imported in each worker, not in the master: the diskcache job queue and the
+# profiler thread must not be shared across fork. Datasets are still shared, because every
+# worker memory-maps the same Arrow files under uploads/datasets and reads them from one page cache.
+preload_app = False
+
+accesslog = "-"
+loglevel = os.environ.get("BI_LOG_LEVEL", "info").lower()
@@ -0,0 +1,115 @@
+import gzip
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from components import datasets, fetch, parsing
+from components.datasets import load_dataset
+from components.fetch import FetchError, stream_url
+
+CSV = b"id,price,region\n" + b"".join(b"%d,%d.5,r%d\n" % (i, i, i % 3) for i in range(500))
+
+
+class Handler(BaseHTTPRequestHandler):
+    # path -> (body, extra headers), set by the test
+    routes = {}
+    requests = []
+
+    def do_GET(self):
+        body, headers = self.routes[self.path]
+        etag = '"%d"' % hash(body)
+        status = 304 if self.headers.get("If-None-Match") == etag else 200
+        self.requests.append((self.path, status))
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status == 304:
+            self.end_headers()
+            return
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(fetch, "CACHE_DIR", str(tmp_path / "url_cache"))
+    monkeypatch.setattr(datasets, "DATASET_DIR", str(tmp_path / "datasets"))
+    Handler.routes, Handler.requests = {}, []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_unchanged_file_is_revalidated_and_read_from_the_copy(server):
+    Handler.routes["/data.csv"] = (CSV, {})
+    first = stream_url(server + "/data.csv")
+    second = stream_url(server + "/data.csv")
+
+    assert Handler.requests == [("/data.csv", 200), ("/data.csv", 304)]
+    assert first["rows"] == second["rows"] == 500
+    assert load_dataset(first).equals(load_dataset(second))
+
+
+def test_dtypes_do_not_depend_on_the_cache(server, monkeypatch):
+    # The first rows look numeric, a later one does not
+    monkeypatch.setattr(parsing, "SAMPLE_ROWS", 10)
+    body = CSV + b"n/a,oops,r1\n"
+    Handler.routes["/mixed.csv"] = (body, {})
+    first = load_dataset(stream_url(server + "/mixed.csv"))
+    second = load_dataset(stream_url(server + "/mixed.csv"))
+
+    assert Handler.requests[-1] == ("/mixed.csv", 304)
+    assert first.dtypes.equals(second.dtypes)
+    assert len(first) == 501
+
+
+def test_gzip_bodies_are_decoded(server):
+    Handler.routes["/encoded.csv"] = (gzip.compress(CSV), {"Content-Encoding": "gzip"})
+    Handler.routes["/file.csv.gz"] = (gzip.compress(CSV), {})
+
+    for path in ("/encoded.csv", "/file.csv.gz"):
+        df = load_dataset(stream_url(server + path))
+        assert len(df) == 500
+        assert list(df.columns) == ["id", "price", "region"]
+
+
+def test_files_over_the_cap_are_rejected(server, monkeypatch):
+    monkeypatch.setattr(fetch, "MAX_BYTES", 1000)
+    Handler.routes["/large.csv"] = (CSV, {})
+    # Small on the wire, but larger than the cap once decoded
+    bomb = gzip.compress(b"id,price,region\n" + b"1,1.5,r1\n" * 5000)
+    assert len(bomb) < 1000
+    Handler.routes["/bomb.csv"] = (bomb, {"Content-Encoding": "gzip"})
+
+    for path in ("/large.csv", "/bomb.csv"):
+        with pytest.raises(FetchError, match="larger than"):
+            stream_url(server + path)
+    # Nothing half-downloaded is left behind
+    assert not [name for name in os.listdir(fetch.CACHE_DIR) if name.endswith(".part")]
+
+
+@pytest.mark.parametrize("url", ["file:///etc/passwd", "ftp://example.com/data.csv", "data.csv"])
+def test_only_http_urls_are_imported(url):
+    with pytest.raises(FetchError, match="http"):
+        stream_url(url)
+
+
+def test_cache_keeps_within_its_budget(server, monkeypatch):
+    monkeypatch.setattr(fetch, "CACHE_MAX_BYTES", len(CSV) + len(CSV) // 2)
+    Handler.routes["/a.csv"] = (CSV, {})
+    Handler.routes["/b.csv"] = (CSV + b"500,1.5,r0\n", {})
+    stream_url(server + "/a.csv")
+    stream_url(server + "/b.csv")
+
+    assert fetch._cached(server + "/a.csv") is None
+    assert fetch._cached(server + "/b.csv") is not None
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import mysql
+
+from components.charts import aggregate_histogram
+from components.pushdown import (aggregate_query, histogram_bins_query, live_aggregate, live_histogram, run_aggregate,
+                                 run_histogram)
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine("sqlite://")
+    rows = pd.DataFrame({
+        "region": ["east", "east", "west", "west", "north"],
+        "sales": [10.0, 30.0, 5.0, 15.0, 7.0],
+        "sold_at": ["2024-01-01 09:00:00", "2024-01-02 10:00:00", "2024-01-02 23:30:00",
+                    "2024-01-03 08:00:00", "2024-01-01 00:00:00"],
+    })
+    with engine.connect() as connection:
+        rows.to_sql("orders", connection, index=False)
+        yield connection
+
+
+def test_query_groups_by_x_and_binds_dates():
+    query = aggregate_query("shop.orders", "histogram", "region", "sales", "sold_at", "2024-01-01", "2024-01-02")
+    sql = str(query)
+    assert "GROUP BY region" in sql
+    assert "shop.orders" in sql
+    # Dates are bound parameters, never part of the SQL text
+    assert "2024-01" not in sql
+
+
+def test_query_rejects_other_graph_types():
+    with pytest.raises(ValueError):
+        aggregate_query("orders", "line", "region", "sales")
+
+
+def test_histogram_averages_per_category(connection):
+    result = run_aggregate(connection, "orders", "histogram", "region", "sales")
+    assert list(result.columns) == ["region", "sales"]
+    assert result.set_index("region")["sales"].to_dict() == {"east": 20.0, "north": 7.0, "west": 10.0}
+
+
+def test_pie_sums_or_counts(connection):
+    sums = run_aggregate(connection, "orders", "pie", "region", "sales")
+    assert sums.set_index("region")["sales"].to_dict() == {"east": 40.0, "north": 7.0, "west": 20.0}
+    counts = run_aggregate(connection, "orders", "pie", "region", None)
+    assert counts.set_index("region")["count"].to_dict() == {"east": 2, "north": 1, "west": 2}
+
+
+def test_end_date_includes_the_whole_day(connection):
+    result = run_aggregate(connection, "orders", "pie", "region", "sales", "sold_at", "2024-01-01", "2024-01-02")
+    # 23:30 on the end day is in range, the next day is not
+    assert result.set_index("region")["sales"].to_dict() == {"east": 40.0, "north": 7.0, "west": 5.0}
+
+
+def test_end_time_is_inclusive(connection):
+    result = run_aggregate(connection, "orders", "pie", "region", "sales", "sold_at",
+                           "2024-01-01", "2024-01-02 10:00:00")
+    assert result.set_index("region")["sales"].to_dict() == {"east": 40.0, "north": 7.0}
+
+
+@pytest.mark.parametrize("bins", [1, 7, 20])
+def test_numeric_histogram_bins_like_the_imported_rows(bins):
+    rng = np.random.default_rng(0)
+    rows = pd.DataFrame({"x": rng.normal(size=1000), "y": rng.uniform(size=1000)})
+    rows.loc[::50, "y"] = np.nan
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        rows.to_sql("points", connection, index=False)
+        live, live_width = run_histogram(connection, "points", "x", "y", bins)
+    local, local_width = aggregate_histogram(rows, "x", "y", bins)
+
+    assert live_width == pytest.approx(local_width)
+    np.testing.assert_allclose(live["x"], local["x"])
+    np.testing.assert_allclose(live["y"], local["y"])
+
+
+def test_bins_are_floored_before_the_cast_on_mysql():
+    # MySQL rounds a DOUBLE cast to SIGNED, which SQLite's truncating cast cannot catch
+    query = histogram_bins_query("points", "x", "y", 10, 0.0, 0.5)
+    sql = str(query.compile(dialect=mysql.dialect()))
+    assert "CAST(floor((x - %s) / %s) AS SIGNED INTEGER)" in sql
+
+
+def test_histogram_of_no_rows(connection):
+    agg, width = run_histogram(connection, "orders", "sales", "sales", 10, "sold_at", "2030-01-01", "2030-01-02")
+    assert agg.empty and width is None
+
+
+@pytest.mark.parametrize("subset", [{"limit": 100}, {"sample": 0.5}, {"columns": ["region", "sold_at"]}])
+def test_subset_imports_are_not_pushed_down(subset):
+    # Returns before connecting, the imported rows are charted instead
+    source = {"type": "mysql", "live": True, "table": "orders", **subset}
+    assert live_aggregate(source, "histogram", "region", "sales") is None
+    assert live_histogram(source, "sales", "sales") is None
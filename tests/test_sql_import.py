@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from components import datasets
+from components.datasets import load_dataset
+from components.sql_import import build_select, refresh_table, stream_table
+
+
+@pytest.fixture
+def connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(datasets, "DATASET_DIR", str(tmp_path / "datasets"))
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        # Stored out of watermark order, so an unordered LIMIT would not take the lowest ids
+        pd.DataFrame({"id": [5, 3, 1, 4, 2], "value": [50, 30, 10, 40, 20]}).to_sql("events", connection, index=False)
+        yield connection
+
+
+def test_capped_watermark_reads_are_ordered(connection):
+    sql = str(build_select(connection, "events", limit=2, after=("id", 3)))
+    assert "ORDER BY id" in sql
+    assert "ORDER BY" not in str(build_select(connection, "events", limit=2))
+
+
+def test_refresh_after_a_capped_import_skips_no_rows(connection):
+    source = {"type": "mysql", "table": "events", "columns": None, "watermark": "id"}
+    handle = stream_table(connection, "events", limit=3, source=source)
+    assert sorted(load_dataset(handle)["id"]) == [1, 2, 3]
+
+    handle = refresh_table(connection, handle, source)
+    assert sorted(load_dataset(handle)["id"]) == [1, 2, 3, 4, 5]